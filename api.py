@@ -1,381 +1,490 @@
-from flask import Flask, jsonify, request, make_response
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
-from runme import Player, Table, create_tiles, distribute_tiles
+from metrics import LOG_FORMAT, logger, metrics, record_request
+from persistence import open_backend
+from runme import Game, GameContext, Player, Table, advance_game, create_tiles, distribute_tiles
+from sessions import GameStore
 import json
+import logging
+import os
+import threading
+import time
 
 app = Flask(__name__)
 
-# Simple CORS configuration
-CORS(app)
+# CORS headers (including preflight answers) for every route
+CORS(app, max_age=3600)
 
-# Add after_request handler to ensure CORS headers are always present
-@app.after_request
-def after_request(response):
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-    response.headers.add('Access-Control-Max-Age', '3600')
-    return response
+# Games in progress, keyed by game id
+games = GameStore()
+
+# Durable copy of every game (deal + move log), so games outlive the process; see persistence.py
+store = open_backend(os.environ.get("DOMINO_STORE", ""))
+# Game id -> lock held while that game is rebuilt from the store, so two requests for
+# it don't both replay it; _restore_lock only guards the dict
+_restoring = {}
+_restore_lock = threading.Lock()
+
+# Strategies the AI seats may play. "Win" is left out: it swaps strategies with its
+# teammate after passing, which would hand the human's seat to the AI or the other way round.
+OPPONENTS = ["AI", "PIMC", "Help", "Block", "Random"]
+# Largest "PIMC" budget per move a client may ask for
+MAX_PIMC_SAMPLES = 1000
+MAX_PIMC_TIME_BUDGET = 2.0
+# Worker processes for "PIMC" rollouts, shared by every game in the process (1 = in-process)
+PIMC_WORKERS = int(os.environ.get("DOMINO_PIMC_WORKERS", os.cpu_count() or 1))
+
+def game_context(pimc_samples=None, pimc_time_budget=None):
+    """Context for a served game, with GameContext's PIMC budget unless one is given"""
+    context = GameContext(pimc_workers=PIMC_WORKERS)
+    if pimc_samples is not None:
+        context.pimc_samples = pimc_samples
+    if pimc_time_budget is not None:
+        context.pimc_time_budget = pimc_time_budget
+    return context
+
+def new_game_state(game):
+    """Fresh state for a game that has just been dealt"""
+    return {
+        "game_id": None,
+        "game": game,
+        "game_history": [],
+        # Everything that happened, in order, for clients following the game (see publish)
+        "events": [],
+        "events_cond": threading.Condition(),
+        # Held while a request reads or changes this game; other games are unaffected
+        "lock": threading.Lock()
+    }
+
+def publish(game_state, events, persist=True):
+    """Append engine events to the game's log and wake up the streams waiting on it.
+
+    Events are numbered from 1 by "seq", so a client that has seen event n only
+    needs the ones after it. game_over also carries the final turn and every
+    hand left, for clients that only follow the stream. The moves are also
+    queued for the store unless persist is False (as when replaying them).
+    The engine's "quiet" flag goes to the store only: a replay needs it, but
+    clients have no use for it.
+    """
+    game = game_state["game"]
+    history = game_state["game_history"]
+    cond = game_state["events_cond"]
+    logged = []
+    with cond:
+        for event in events:
+            event["seq"] = len(game_state["events"]) + 1
+            logged.append(dict(event))
+            event.pop("quiet", None)
+            if event["type"] == "tile_played":
+                history.append({
+                    "player": event["player"],
+                    "action": "played",
+                    "tile": event["tile"],
+                    "reasoning": f"Player {event['player']} played tile {event['tile']}"
+                })
+            elif event["type"] == "pass":
+                history.append({
+                    "player": event["player"],
+                    "action": "passed",
+                    "tile": None,
+                    "reasoning": f"Player {event['player']} has no valid moves"
+                })
+            else:
+                event.update(turn_count=game.turn_count,
+                             passes=game.passes,
+                             current_player_index=game.current_player_index,
+                             hands=[[serialize_tile(t) for t in p.tiles] for p in game.players])
+            game_state["events"].append(event)
+        cond.notify_all()
+
+    if persist:
+        # The AI strategies remember the opening tile; store it along with the move that placed it
+        table = game.table
+        opened_now = len(table.played_tiles) == sum(e["type"] == "tile_played" for e in events) > 0
+        store.append(game_state["game_id"], logged, table.context.initial_tile if opened_now else None)
+
+def deal_snapshot(game):
+    """What a game's log is replayed from: each player's name, strategy and tiles, and the PIMC budget"""
+    context = game.table.context
+    return {"players": [{"name": p.name, "strategy": p.strategy, "tiles": [list(t) for t in p.tiles]}
+                        for p in game.players],
+            "pimc_samples": context.pimc_samples,
+            "pimc_time_budget": context.pimc_time_budget}
+
+def restore_game(game_id):
+    """Rebuild a stored game by replaying its move log, or None if it isn't stored"""
+    stored = store.load(game_id)
+    if stored is None:
+        return None
+    deal, initial_tile, moves = stored
+    players = []
+    for seat in deal["players"]:
+        player = Player(seat["name"], seat["strategy"])
+        player.tiles = [list(t) for t in seat["tiles"]]
+        players.append(player)
+    game = Game(players, Table(game_context(deal.get("pimc_samples"), deal.get("pimc_time_budget"))))
+    game_state = new_game_state(game)
+    game_state["game_id"] = game_id
+    for move in moves:
+        if move["action"] == "play":
+            # The log has the tile as placed; the hand may hold it the other way round
+            placed = sorted(move["tile"])
+            tile = next(t for t in game.current_player.tiles if sorted(t) == placed)
+            events = game.play(tile, move["side"], move["quiet"])
+        else:
+            events = game.pass_turn()
+        publish(game_state, events, persist=False)
+    game.table.context.initial_tile = initial_tile
+    # The log may stop partway through the AI turns if the process died while writing
+    publish(game_state, advance_game(game))
+    return game_state
+
+def find_game(game_id):
+    """The game with this id, restored from the store if this process doesn't have it
+    or its copy is stale (another process logged different moves for it first)"""
+    game_state = games.get(game_id)
+    if game_state is None or store.stale(game_id):
+        with _restore_lock:
+            lock = _restoring.setdefault(game_id, threading.Lock())
+        # Other games are restored (and their AI turns played) meanwhile
+        with lock:
+            game_state = games.get(game_id)
+            if game_state is None or store.stale(game_id):
+                game_state = restore_game(game_id)
+                if game_state is not None:
+                    games.add(game_state, game_id)
+                else:
+                    games.remove(game_id)
+        with _restore_lock:
+            _restoring.pop(game_id, None)
+    return game_state
+
+def events_since(game_state, since):
+    """Events after number since"""
+    with game_state["events_cond"]:
+        return game_state["events"][since:]
+
+def format_sse(event):
+    """One server-sent event; the seq doubles as the id a reconnecting browser sends back"""
+    return f"id: {event['seq']}\ndata: {json.dumps(event)}\n\n"
+
+def action_result(game_state, start, message):
+    """Body for a successful play or skip: the events it produced, not the whole game,
+    and what the player whose turn it now is may play"""
+    valid_moves, ambiguous = current_legal_moves(game_state)
+    return {
+        "success": True,
+        "message": message,
+        "events": events_since(game_state, start),
+        "seq": len(game_state["events"]),
+        "valid_moves": valid_moves,
+        "ambiguous_tiles": ambiguous
+    }, 200
 
-# Global game state
-game_state = {
-    "table": None,
-    "players": None,
-    "current_player_index": 0,
-    "turn_count": 0,
-    "passes": 0,
-    "game_over": False,
-    "winner": None,
-    "game_locked": False,
-    "game_history": []
-}
+def game_not_found():
+    return jsonify(GAME_NOT_FOUND), 404
+
+GAME_NOT_FOUND = {"error": "Game not found"}
 
 def serialize_tile(tile):
     """Convert a tile to a JSON-serializable format"""
     return tile if isinstance(tile, list) else list(tile)
 
-def get_game_state_json():
-    """Get the current game state as JSON"""
-    if not game_state["table"]:
-        return None
+def get_game_state_json(game_state):
+    """Get the game state as JSON"""
+    game = game_state["game"]
+    table = game.table
     
     players_data = []
-    for i, player in enumerate(game_state["players"]):
+    for i, player in enumerate(game.players):
         players_data.append({
             "name": player.name,
             "strategy": player.strategy,
             "tiles": [serialize_tile(t) for t in player.tiles],
             "tile_count": len(player.tiles),
             "team": player.team,
-            "is_current": i == game_state["current_player_index"]
+            "is_current": i == game.current_player_index
         })
     
-    # Calculate team points for locked games
-    team_ac_points = sum(game_state["table"].count_points(p) for p in game_state["players"] if p.team == "AC")
-    team_bd_points = sum(game_state["table"].count_points(p) for p in game_state["players"] if p.team == "BD")
+    # Team points, which decide locked games
+    team_ac_points, team_bd_points = game.team_points()
+    valid_moves, ambiguous = current_legal_moves(game_state)
     
     return {
-        "table": [serialize_tile(t) for t in game_state["table"].played_tiles],
-        "playable_numbers": game_state["table"].get_playable_numbers(),
+        "game_id": game_state["game_id"],
+        "table": [serialize_tile(t) for t in table.played_tiles],
+        "playable_numbers": table.get_playable_numbers(),
         "players": players_data,
-        "current_player": game_state["players"][game_state["current_player_index"]].name,
-        "current_player_index": game_state["current_player_index"],
-        "turn_count": game_state["turn_count"],
-        "passes": game_state["passes"],
-        "game_over": game_state["game_over"],
-        "winner": game_state["winner"],
-        "game_locked": game_state["game_locked"],
+        "current_player": game.current_player.name,
+        "current_player_index": game.current_player_index,
+        "turn_count": game.turn_count,
+        "passes": game.passes,
+        "game_over": game.game_over,
+        "winner": game.winner.name if game.winner else None,
+        "game_locked": game.game_locked,
         "team_ac_points": team_ac_points,
         "team_bd_points": team_bd_points,
-        "play_history": [(name, serialize_tile(tile)) for name, tile in game_state["table"].play_history],
-        "game_history": game_state["game_history"][-3:]  # Return only last 3 moves
+        "play_history": [(name, serialize_tile(tile)) for name, tile in table.play_history],
+        "game_history": game_state["game_history"][-3:],  # Return only last 3 moves
+        "seq": len(game_state["events"]),  # Last event included in this state
+        "valid_moves": valid_moves,
+        "ambiguous_tiles": ambiguous
     }
 
+def state_body(game_state, since=None):
+    """The game's state as a JSON string, or only what changed after version since.
+
+    The version is the seq of the last event. The full state is serialized once
+    per version and kept on the game, so polling an unchanged game costs nothing;
+    a client that already has version since gets the events after it (plus the
+    current player's valid moves) instead.
+    """
+    version = len(game_state["events"])
+    if since is not None and 0 <= since <= version:
+        valid_moves, ambiguous = current_legal_moves(game_state)
+        return json.dumps({"seq": version, "events": events_since(game_state, since),
+                           "valid_moves": valid_moves, "ambiguous_tiles": ambiguous})
+    cached = game_state.get("snapshot")
+    if cached is None or cached[0] != version:
+        cached = game_state["snapshot"] = (version, json.dumps(get_game_state_json(game_state)))
+    return cached[1]
+
+def json_response(body, status=200):
+    """Response for an already serialized JSON body"""
+    return app.response_class(body, status=status, mimetype='application/json')
+
 @app.before_request
-def log_request():
-    print(f"Request: {request.method} {request.path}")
-    print(f"Host: {request.host}")
-    print(f"Remote Addr: {request.remote_addr}")
-    print(f"Content-Type: {request.content_type}")
+def start_timer():
+    g.request_start = time.perf_counter()
 
-@app.route('/api/game/start', methods=['POST', 'OPTIONS'])
-def start_game():
-    """Initialize a new game"""
-    print(f"start_game called with method {request.method}")
-    data = request.json or {}
+@app.after_request
+def count_request(response):
+    # Routes are labelled by their rule, so every game shares one histogram
+    rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    record_request(request.method, rule, response.status_code,
+                   time.perf_counter() - g.request_start, request.path)
+    return response
+
+# Game actions. Each takes a game state (and the request data) and returns a
+# (body, status) pair, so the threaded Flask app below and the asyncio server
+# in async_api.py share them. Callers hold the game's lock.
+
+def is_number(value, kinds=(int,)):
+    """True for a JSON number of one of these types. bool is a subclass of int, so
+    isinstance alone would take true and false for 1 and 0."""
+    return isinstance(value, kinds) and not isinstance(value, bool)
+
+def start_options(data):
+    """(keyword arguments for create_game, None) from a /start request body, or (None, error)"""
     player_position = data.get('player_position', 0)  # 0, 1, 2, or 3
-    
-    print(f"Starting game with player position {player_position}")
-    
-    # Reset game state
+    if not (is_number(player_position) and player_position in (0, 1, 2, 3)):
+        return None, "player_position must be 0, 1, 2 or 3"
+    opponent = data.get('opponent', "AI")
+    if opponent not in OPPONENTS:
+        return None, f"opponent must be one of {', '.join(OPPONENTS)}"
+    pimc_samples = data.get('pimc_samples')
+    if pimc_samples is not None and not (is_number(pimc_samples)
+                                         and 1 <= pimc_samples <= MAX_PIMC_SAMPLES):
+        return None, f"pimc_samples must be a whole number from 1 to {MAX_PIMC_SAMPLES}"
+    pimc_time_budget = data.get('pimc_time_budget')
+    if pimc_time_budget is not None and not (is_number(pimc_time_budget, (int, float))
+                                             and 0 < pimc_time_budget <= MAX_PIMC_TIME_BUDGET):
+        return None, f"pimc_time_budget must be more than 0 and at most {MAX_PIMC_TIME_BUDGET} seconds"
+    return {"player_position": player_position, "opponent": opponent,
+            "pimc_samples": pimc_samples, "pimc_time_budget": pimc_time_budget}, None
+
+def create_game(player_position, opponent="AI", pimc_samples=None, pimc_time_budget=None):
+    """Deal a new game with a human at player_position and store it.
+
+    Every other seat plays the opponent strategy; pimc_samples and
+    pimc_time_budget set the per-move budget of "PIMC" opponents.
+    """
     tiles = create_tiles()
-    table = Table()
-    players = [Player(name, "AI") for name in ["A", "B", "C", "D"]]
+    players = [Player(name, opponent) for name in ["A", "B", "C", "D"]]
     
-    # Set human player
+    # Set human player; everyone else plays the opponent strategy
     players[player_position].strategy = "User"
     
-    # Set all other players to AI strategy
-    for i, player in enumerate(players):
-        if i != player_position:
-            player.strategy = "AI"
-    
-    # Give each player access to all players
-    for player in players:
-        player.all_players = players
-    
     distribute_tiles(players, tiles)
     
-    game_state["table"] = table
-    game_state["players"] = players
-    game_state["current_player_index"] = 0
-    game_state["turn_count"] = 0
-    game_state["passes"] = 0
-    game_state["game_over"] = False
-    game_state["winner"] = None
-    game_state["game_locked"] = False
-    game_state["game_history"] = []
-    
-    return jsonify(get_game_state_json())
+    game = Game(players, Table(game_context(pimc_samples, pimc_time_budget)))
+    game_state = new_game_state(game)
+    game_state["game_id"] = games.add(game_state)
+    store.save_game(game_state["game_id"], deal_snapshot(game))
+    # AI players seated before the human open the game
+    publish(game_state, advance_game(game))
+    return game_state
 
-@app.route('/api/game/state', methods=['GET', 'OPTIONS'])
-def get_state():
-    """Get current game state"""
-    if not game_state["table"]:
-        return jsonify({"error": "No game in progress"}), 400
-    return jsonify(get_game_state_json())
-
-@app.route('/api/game/play', methods=['POST', 'OPTIONS'])
-def play_turn():
-    """Play a tile for the current player"""
-    if game_state["game_over"]:
-        return jsonify({"error": "Game is over"}), 400
+def apply_play(game_state, data):
+    """Play a tile for the current player, then the AI turns that follow"""
+    game = game_state["game"]
+    if game.game_over:
+        return {"error": "Game is over"}, 400
     
-    data = request.json
+    start = len(game_state["events"])
     tile_index = data.get('tile_index')
     side = data.get('side', None)  # 'L' or 'R' for ambiguous placements
     
-    current_player = game_state["players"][game_state["current_player_index"]]
-    
-    if tile_index is not None and 0 <= tile_index < len(current_player.tiles):
-        tile = current_player.tiles[tile_index]
-        current_player.tiles.pop(tile_index)
-        
-        # Log the move to game history
-        game_state["game_history"].append({
-            "player": current_player.name,
-            "action": "played",
-            "tile": list(tile),
-            "reasoning": f"Player {current_player.name} played tile {list(tile)}"
-        })
-        
-        # Handle tile placement
-        if side:
-            if side == 'L':
-                if tile[1] == game_state["table"].played_tiles[0][0]:
-                    game_state["table"].played_tiles.insert(0, tile)
-                else:
-                    game_state["table"].played_tiles.insert(0, tile[::-1])
-            else:  # side == 'R'
-                if tile[0] == game_state["table"].played_tiles[-1][1]:
-                    game_state["table"].played_tiles.append(tile)
-                else:
-                    game_state["table"].played_tiles.append(tile[::-1])
-        else:
-            game_state["table"].play_tile(tile, current_player.name)
-        
-        # Check if player won
-        if not current_player.tiles:
-            game_state["game_over"] = True
-            game_state["winner"] = current_player.name
-            return jsonify({
-                "success": True,
-                "message": f"Player {current_player.name} played {tile}",
-                "game_state": get_game_state_json()
-            })
-        
-        # Move to next player
-        game_state["passes"] = 0
-        game_state["turn_count"] += 1
-        game_state["current_player_index"] = (game_state["current_player_index"] + 1) % len(game_state["players"])
-        
-        # Play AI turns until it's human's turn or game ends
-        while True:
-            current_player = game_state["players"][game_state["current_player_index"]]
-            
-            # Skip if it's the human player (strategy == "User")
-            if current_player.strategy == "User":
-                break
-            
-            played_tile = current_player.play_turn(game_state["table"])
-            
-            if not played_tile:
-                game_state["passes"] += 1
-                # Log the pass
-                game_state["game_history"].append({
-                    "player": current_player.name,
-                    "action": "passed",
-                    "tile": None,
-                    "reasoning": f"Player {current_player.name} has no valid moves"
-                })
-            else:
-                game_state["passes"] = 0
-                # Log the AI move
-                game_state["game_history"].append({
-                    "player": current_player.name,
-                    "action": "played",
-                    "tile": list(played_tile),
-                    "reasoning": f"AI Player {current_player.name} played tile {list(played_tile)}"
-                })
-            
-            if not current_player.tiles:
-                game_state["game_over"] = True
-                game_state["winner"] = current_player.name
-                break
-            
-            if game_state["passes"] >= len(game_state["players"]):
-                game_state["game_over"] = True
-                game_state["game_locked"] = True
-                # Calculate winner based on points
-                team_ac_points = sum(game_state["table"].count_points(p) for p in game_state["players"] if p.team == "AC")
-                team_bd_points = sum(game_state["table"].count_points(p) for p in game_state["players"] if p.team == "BD")
-                if team_ac_points < team_bd_points:
-                    game_state["winner"] = "A"
-                else:
-                    game_state["winner"] = "B"
-                break
-            
-            game_state["turn_count"] += 1
-            game_state["current_player_index"] = (game_state["current_player_index"] + 1) % len(game_state["players"])
-        
-        return jsonify({
-            "success": True,
-            "message": f"Player played successfully",
-            "game_state": get_game_state_json()
-        })
+    current_player = game.current_player
+    if not is_number(tile_index) or not 0 <= tile_index < len(current_player.tiles):
+        return {"error": "Invalid tile index"}, 400
+    # One mask lookup per tile, see Table.legal_moves
+    valid_moves, ambiguous = current_legal_moves(game_state)
+    if tile_index not in valid_moves:
+        return {"error": "That tile doesn't match an open end"}, 400
+    if tile_index in ambiguous:
+        if side not in ('L', 'R'):
+            return {"error": "That tile fits both ends; side must be 'L' or 'R'"}, 400
     else:
-        return jsonify({"error": "Invalid tile index"}), 400
-
-@app.route('/api/game/get-valid-moves', methods=['GET', 'OPTIONS'])
-def get_valid_moves():
-    """Get valid moves for the current player"""
-    if not game_state["table"]:
-        return jsonify({"error": "No game in progress"}), 400
+        side = None  # It can only go one way; a side would force it onto the wrong end
     
-    current_player = game_state["players"][game_state["current_player_index"]]
-    playable_numbers = game_state["table"].get_playable_numbers()
-    
-    valid_moves = []
-    ambiguous = []
-    
-    for i, tile in enumerate(current_player.tiles):
-        if not playable_numbers:
-            # First move - any tile is valid
-            valid_moves.append(i)
-        else:
-            # Check if tile can play on left end
-            left_playable = tile[0] == game_state["table"].played_tiles[0][0] or tile[1] == game_state["table"].played_tiles[0][0]
-            # Check if tile can play on right end
-            right_playable = tile[0] == game_state["table"].played_tiles[-1][1] or tile[1] == game_state["table"].played_tiles[-1][1]
-            
-            if left_playable or right_playable:
-                valid_moves.append(i)
-                # If playable on both sides, mark as ambiguous
-                if left_playable and right_playable:
-                    ambiguous.append(i)
-    
-    return jsonify({
+    tile = current_player.tiles[tile_index]
+    events = game.play(tile, side)
+    # Play AI turns until it's the human's turn or the game ends
+    events += advance_game(game)
+    publish(game_state, events)
+    return action_result(game_state, start, f"Player {current_player.name} played {tile}")
+
+def current_legal_moves(game_state):
+    """Valid and ambiguous (playable on both ends) tile indexes for the current player"""
+    game = game_state["game"]
+    if game.game_over:
+        return [], []
+    return game.table.legal_moves(game.current_player.tiles)
+
+def list_valid_moves(game_state):
+    """Valid and ambiguous (playable on both ends) tile indexes for the current player"""
+    valid_moves, ambiguous = current_legal_moves(game_state)
+    return {
         "valid_moves": valid_moves,
         "ambiguous_tiles": ambiguous
-    })
+    }, 200
 
-@app.route('/api/game/skip', methods=['POST', 'OPTIONS'])
-def skip_turn():
-    """Skip the current player's turn (no valid moves)"""
-    if game_state["game_over"]:
-        return jsonify({"error": "Game is over"}), 400
-    
-    current_player = game_state["players"][game_state["current_player_index"]]
+def apply_skip(game_state):
+    """Skip the current player's turn (no valid moves), then the AI turns that follow"""
+    game = game_state["game"]
+    if game.game_over:
+        return {"error": "Game is over"}, 400
     
-    # Log the pass
-    game_state["game_history"].append({
-        "player": current_player.name,
-        "action": "passed",
-        "tile": None,
-        "reasoning": f"Player {current_player.name} has no valid moves"
-    })
+    valid_moves, _ = current_legal_moves(game_state)
+    if valid_moves:
+        return {"error": "A tile can be played; skipping is only allowed without one"}, 400
     
-    game_state["passes"] += 1
-    
-    # Check if all 4 players have passed (game locked)
-    if game_state["passes"] >= len(game_state["players"]):
-        game_state["game_over"] = True
-        game_state["game_locked"] = True
-        # Calculate winner based on points
-        team_ac_points = sum(game_state["table"].count_points(p) for p in game_state["players"] if p.team == "AC")
-        team_bd_points = sum(game_state["table"].count_points(p) for p in game_state["players"] if p.team == "BD")
-        if team_ac_points < team_bd_points:
-            game_state["winner"] = "A"
-        else:
-            game_state["winner"] = "B"
-        return jsonify({
-            "success": True,
-            "message": "Game locked - all players passed",
-            "game_state": get_game_state_json()
-        })
-    
-    # Move to next player
-    game_state["turn_count"] += 1
-    game_state["current_player_index"] = (game_state["current_player_index"] + 1) % len(game_state["players"])
+    start = len(game_state["events"])
+    current_player = game.current_player
+    events = game.pass_turn()
+    events += advance_game(game)
+    publish(game_state, events)
+    if game.game_locked:
+        return action_result(game_state, start, "Game locked - all players passed")
+    return action_result(game_state, start, f"Player {current_player.name} skipped")
+
+# Routes
+
+@app.route('/api/game/start', methods=['POST'])
+def start_game():
+    """Initialize a new game"""
+    data = request.json or {}
+    options, error = start_options(data)
+    if error:
+        return jsonify({"error": error}), 400
     
-    # Play AI turns until it's human's turn or game ends
+    logger.debug("Starting game with %s", options)
+    game_state = create_game(**options)
+    return json_response(state_body(game_state))
+
+@app.route('/api/game/<game_id>/state', methods=['GET'])
+def get_state(game_id):
+    """Get current game state, or the changes since ?since=<version>"""
+    game_state = find_game(game_id)
+    if game_state is None:
+        return game_not_found()
+    since = request.args.get('since', type=int)
+    with game_state["lock"]:
+        body = state_body(game_state, since)
+    return json_response(body)
+
+@app.route('/api/game/<game_id>/play', methods=['POST'])
+def play_turn(game_id):
+    """Play a tile for the current player"""
+    game_state = find_game(game_id)
+    if game_state is None:
+        return game_not_found()
+    with game_state["lock"]:
+        body, status = apply_play(game_state, request.json)
+    return jsonify(body), status
+
+@app.route('/api/game/<game_id>/get-valid-moves', methods=['GET'])
+def get_valid_moves(game_id):
+    """Get valid moves for the current player"""
+    game_state = find_game(game_id)
+    if game_state is None:
+        return game_not_found()
+    with game_state["lock"]:
+        body, status = list_valid_moves(game_state)
+    return jsonify(body), status
+
+@app.route('/api/game/<game_id>/skip', methods=['POST'])
+def skip_turn(game_id):
+    """Skip the current player's turn (no valid moves)"""
+    game_state = find_game(game_id)
+    if game_state is None:
+        return game_not_found()
+    with game_state["lock"]:
+        body, status = apply_skip(game_state)
+    return jsonify(body), status
+
+def event_stream(game_state, since):
+    """Server-sent events for a game from number since on, until it is over.
+
+    Each open stream holds one server thread while it waits; see async_api.py
+    for a server where waiting streams cost next to nothing.
+    """
+    cond = game_state["events_cond"]
     while True:
-        current_player = game_state["players"][game_state["current_player_index"]]
-        
-        # Skip if it's the human player (strategy == "User")
-        if current_player.strategy == "User":
-            break
-        
-        played_tile = current_player.play_turn(game_state["table"])
-        
-        if not played_tile:
-            game_state["passes"] += 1
-            # Log the pass
-            game_state["game_history"].append({
-                "player": current_player.name,
-                "action": "passed",
-                "tile": None,
-                "reasoning": f"Player {current_player.name} has no valid moves"
-            })
-        else:
-            game_state["passes"] = 0
-            # Log the AI move
-            game_state["game_history"].append({
-                "player": current_player.name,
-                "action": "played",
-                "tile": list(played_tile),
-                "reasoning": f"AI Player {current_player.name} played tile {list(played_tile)}"
-            })
-        
-        if not current_player.tiles:
-            game_state["game_over"] = True
-            game_state["winner"] = current_player.name
-            break
-        
-        if game_state["passes"] >= len(game_state["players"]):
-            game_state["game_over"] = True
-            game_state["game_locked"] = True
-            # Calculate winner based on points
-            team_ac_points = sum(game_state["table"].count_points(p) for p in game_state["players"] if p.team == "AC")
-            team_bd_points = sum(game_state["table"].count_points(p) for p in game_state["players"] if p.team == "BD")
-            if team_ac_points < team_bd_points:
-                game_state["winner"] = "A"
-            else:
-                game_state["winner"] = "B"
-            break
-        
-        game_state["turn_count"] += 1
-        game_state["current_player_index"] = (game_state["current_player_index"] + 1) % len(game_state["players"])
-    
-    return jsonify({
-        "success": True,
-        "message": f"Player {current_player.name} skipped",
-        "game_state": get_game_state_json()
-    })
-
-@app.route('/api/game/reset', methods=['POST', 'OPTIONS'])
-def reset_game():
-    """Reset the game"""
-    game_state["table"] = None
-    game_state["players"] = None
-    game_state["current_player_index"] = 0
-    game_state["turn_count"] = 0
-    game_state["passes"] = 0
-    game_state["game_over"] = False
-    game_state["winner"] = None
-    game_state["game_locked"] = False
-    game_state["game_history"] = []
+        with cond:
+            if len(game_state["events"]) <= since:
+                cond.wait(timeout=15)
+            new = game_state["events"][since:]
+        if not new:
+            if game_state["game"].game_over:
+                return
+            yield ": keep-alive\n\n"
+            continue
+        for event in new:
+            yield format_sse(event)
+        since = new[-1]["seq"]
+        if new[-1]["type"] == "game_over":
+            return
+
+def stream_start(default=0):
+    """Event number a stream starts after: the browser's Last-Event-ID on reconnect, else ?since="""
+    last_id = request.headers.get('Last-Event-ID')
+    if last_id and last_id.isdigit():
+        return int(last_id)
+    return request.args.get('since', default, type=int)
+
+@app.route('/api/game/<game_id>/events', methods=['GET'])
+def stream_events(game_id):
+    """Push the game's events as they happen (server-sent events)"""
+    game_state = find_game(game_id)
+    if game_state is None:
+        return game_not_found()
+    return Response(event_stream(game_state, stream_start()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache, no-transform', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request counts and latency histograms, for a local Prometheus or curl"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/game/<game_id>/reset', methods=['POST'])
+def reset_game(game_id):
+    """End a game and free its slot"""
+    games.remove(game_id)
+    store.delete(game_id)
     return jsonify({"success": True})
 
 if __name__ == '__main__':
+    logging.basicConfig(format=LOG_FORMAT)
     app.run(debug=False, host='0.0.0.0', port=5001, threaded=True)
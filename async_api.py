@@ -0,0 +1,177 @@
+"""Asyncio serving mode for the game API, built on Quart.
+
+Same routes, game store and game logic as api.py. Each game gets an
+asyncio.Lock so requests for one game are handled one at a time while other
+games carry on, and the game actions (which run the AI turns) execute on a
+thread pool so a slow AI turn never blocks the event loop. Event streams wait
+on the event loop too, so an idle stream holds no thread.
+
+    pip install quart quart-cors
+    python async_api.py
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, Response, g, jsonify, request
+from quart_cors import cors
+
+import api
+from api import games, GAME_NOT_FOUND
+from metrics import LOG_FORMAT, metrics, record_request
+
+app = cors(Quart(__name__), allow_origin="*")
+
+# Threads that run game actions; the event loop only routes requests
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get("DOMINO_AI_WORKERS", "8")))
+
+
+@app.before_request
+async def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+async def count_request(response):
+    rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    record_request(request.method, rule, response.status_code,
+                   time.perf_counter() - g.request_start, request.path)
+    return response
+
+async def find_game(game_id):
+    """api.find_game, with a restore from the store run off the event loop"""
+    game_state = games.get(game_id)
+    if game_state is None or api.store.stale(game_id):
+        loop = asyncio.get_running_loop()
+        game_state = await loop.run_in_executor(executor, api.find_game, game_id)
+    return game_state
+
+def _game_lock(game_state):
+    # Created lazily on the event loop thread, so there's no race between requests
+    lock = game_state.get("async_lock")
+    if lock is None:
+        lock = game_state["async_lock"] = asyncio.Lock()
+    return lock
+
+def _locked(fn, game_state, *args):
+    # Also take the thread lock, in case the game is touched from api.py in the same process
+    with game_state["lock"]:
+        return fn(game_state, *args)
+
+def _new_events_signal(game_state):
+    # Set (and replaced) each time an action on this game finishes
+    signal = game_state.get("async_signal")
+    if signal is None:
+        signal = game_state["async_signal"] = asyncio.Event()
+    return signal
+
+async def run_game_action(game_state, fn, *args):
+    """Run fn(game_state, *args) on the executor while holding the game's lock"""
+    async with _game_lock(game_state):
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(executor, _locked, fn, game_state, *args)
+    signal = game_state.pop("async_signal", None)
+    if signal is not None:
+        signal.set()
+    return result
+
+async def event_stream(game_state, since):
+    """Async counterpart of api.event_stream"""
+    while True:
+        signal = _new_events_signal(game_state)
+        new = api.events_since(game_state, since)
+        if not new:
+            if game_state["game"].game_over:
+                return
+            try:
+                await asyncio.wait_for(signal.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+            continue
+        for event in new:
+            yield api.format_sse(event)
+        since = new[-1]["seq"]
+        if new[-1]["type"] == "game_over":
+            return
+
+@app.route('/api/game/start', methods=['POST'])
+async def start_game():
+    """Initialize a new game"""
+    data = await request.get_json(silent=True) or {}
+    options, error = api.start_options(data)
+    if error:
+        return jsonify({"error": error}), 400
+    loop = asyncio.get_running_loop()
+    game_state = await loop.run_in_executor(executor, functools.partial(api.create_game, **options))
+    return Response(api.state_body(game_state), mimetype='application/json')
+
+@app.route('/api/game/<game_id>/state', methods=['GET'])
+async def get_state(game_id):
+    """Get current game state, or the changes since ?since=<version>"""
+    game_state = await find_game(game_id)
+    if game_state is None:
+        return jsonify(GAME_NOT_FOUND), 404
+    since = request.args.get('since', type=int)
+    async with _game_lock(game_state):
+        body = api.state_body(game_state, since)
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/game/<game_id>/play', methods=['POST'])
+async def play_turn(game_id):
+    """Play a tile for the current player"""
+    game_state = await find_game(game_id)
+    if game_state is None:
+        return jsonify(GAME_NOT_FOUND), 404
+    data = await request.get_json(silent=True) or {}
+    body, status = await run_game_action(game_state, api.apply_play, data)
+    return jsonify(body), status
+
+@app.route('/api/game/<game_id>/get-valid-moves', methods=['GET'])
+async def get_valid_moves(game_id):
+    """Get valid moves for the current player"""
+    game_state = await find_game(game_id)
+    if game_state is None:
+        return jsonify(GAME_NOT_FOUND), 404
+    async with _game_lock(game_state):
+        body, status = api.list_valid_moves(game_state)
+    return jsonify(body), status
+
+@app.route('/api/game/<game_id>/skip', methods=['POST'])
+async def skip_turn(game_id):
+    """Skip the current player's turn (no valid moves)"""
+    game_state = await find_game(game_id)
+    if game_state is None:
+        return jsonify(GAME_NOT_FOUND), 404
+    body, status = await run_game_action(game_state, api.apply_skip)
+    return jsonify(body), status
+
+@app.route('/api/game/<game_id>/events', methods=['GET'])
+async def stream_events(game_id):
+    """Push the game's events as they happen (server-sent events)"""
+    game_state = await find_game(game_id)
+    if game_state is None:
+        return jsonify(GAME_NOT_FOUND), 404
+    last_id = request.headers.get('Last-Event-ID')
+    since = int(last_id) if last_id and last_id.isdigit() else request.args.get('since', 0, type=int)
+    response = Response(event_stream(game_state, since), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache, no-transform', 'X-Accel-Buffering': 'no'})
+    response.timeout = None  # Streams stay open for the whole game
+    return response
+
+@app.route('/metrics', methods=['GET'])
+async def get_metrics():
+    """Request counts and latency histograms, for a local Prometheus or curl"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/game/<game_id>/reset', methods=['POST'])
+async def reset_game(game_id):
+    """End a game and free its slot"""
+    games.remove(game_id)
+    api.store.delete(game_id)
+    return jsonify({"success": True})
+
+if __name__ == '__main__':
+    logging.basicConfig(format=LOG_FORMAT)
+    app.run(host='0.0.0.0', port=5001)
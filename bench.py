@@ -0,0 +1,194 @@
+"""Benchmarks for the game engine, the strategies and the API.
+
+    python bench.py                          # run everything, print the results
+    python bench.py --out bench.json         # ... and save them
+    python bench.py --compare bench.json     # ... and compare with a saved run
+
+Measures games per second of simulate_game for each strategy mix, the latency
+of Player.play_turn per strategy, Table.play_tile / will_lock_game, and
+requests per second of the api.py endpoints through the Flask test client.
+Every run uses fixed seeds, so two runs on the same machine play the same
+games. --compare exits with status 1 when a result is worse than the
+baseline by more than --tolerance.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import time
+
+from runme import Game, GameContext, Player, Table, advance_game, create_tiles, distribute_tiles, simulate_game
+
+STRATEGIES = ["Win", "Help", "Block", "Random", "AI"]
+
+# name -> {"value", "unit", "higher_is_better"}
+results = {}
+
+
+def record(name, value, unit, higher_is_better):
+    results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+    print(f"{name:55} {value:12.2f} {unit}")
+
+
+def bench_games(n_games):
+    """Games per second for every strategy on its own and against the AI strategy"""
+    mixes = {f"{s}x4": (s,) * 4 for s in STRATEGIES}
+    mixes.update({f"{s}_vs_AI": (s, "AI", s, "AI") for s in STRATEGIES if s != "AI"})
+    for name, strategies in mixes.items():
+        rng = random.Random(1)
+        start = time.perf_counter()
+        for _ in range(n_games):
+            simulate_game(rng=rng, strategies=strategies)
+        record(f"games/{name}", n_games / (time.perf_counter() - start), "games/s", True)
+
+
+def bench_play_turn(n_games):
+    """Mean time of one Player.play_turn call per strategy, over whole games"""
+    for strategy in STRATEGIES:
+        rng = random.Random(2)
+        elapsed = 0.0
+        calls = 0
+        for _ in range(n_games):
+            players = [Player(name, strategy, rng=rng) for name in "ABCD"]
+            distribute_tiles(players, create_tiles(), rng)
+            # Same settings as simulate_game, endgame search off
+            game = Game(players, Table(GameContext(endgame=None)))
+            while not game.game_over:
+                player = game.current_player
+                start = time.perf_counter()
+                tile = player.play_turn(game.table)
+                elapsed += time.perf_counter() - start
+                calls += 1
+                game._end_turn(player, tile is not None)
+        record(f"play_turn/{strategy}", elapsed / calls * 1e6, "us/call", False)
+
+
+def recorded_lines(n_games):
+    """The order tiles were placed in, with their side, for n AI games"""
+    rng = random.Random(3)
+    lines = []
+    for _ in range(n_games):
+        players = [Player(name, "AI", rng=rng) for name in "ABCD"]
+        distribute_tiles(players, create_tiles(), rng)
+        game = Game(players, Table(GameContext(endgame=None)))
+        moves = []
+        while not game.game_over:
+            for event in advance_game(game, max_steps=1):
+                if event["type"] == "tile_played":
+                    moves.append((event["tile"], event["side"]))
+        lines.append(moves)
+    return lines
+
+
+def bench_table(n_games, repeat):
+    """Table.play_tile and will_lock_game, replaying recorded lines of play"""
+    lines = recorded_lines(n_games)
+    calls = sum(len(moves) for moves in lines) * repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for moves in lines:
+            table = Table()
+            for tile, side in moves:
+                table.play_tile(tile, "A", force_left=(side == 'L'), force_right=(side == 'R'))
+    record("table/play_tile", (time.perf_counter() - start) / calls * 1e9, "ns/call", False)
+
+    # Tables halfway through each game, asked about every tile on both ends
+    tables = []
+    for moves in lines:
+        table = Table()
+        for tile, side in moves[:len(moves) // 2]:
+            table.play_tile(tile, "A", force_left=(side == 'L'), force_right=(side == 'R'))
+        tables.append(table)
+    tiles = create_tiles()
+    calls = len(tables) * len(tiles) * 2 * repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for table in tables:
+            for tile in tiles:
+                table.will_lock_game(tile, True)
+                table.will_lock_game(tile, False)
+    record("table/will_lock_game", (time.perf_counter() - start) / calls * 1e9, "ns/call", False)
+
+
+def bench_api(n_games):
+    """Requests per second for each endpoint, playing whole games through the test client"""
+    import api
+    client = api.app.test_client()
+    random.seed(4)  # The API games deal from the global RNG
+    timings = {}
+
+    def timed(route, method, url, **kwargs):
+        start = time.perf_counter()
+        response = getattr(client, method)(url, **kwargs)
+        timings.setdefault(route, []).append(time.perf_counter() - start)
+        return response.get_json()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for g in range(n_games):
+            state = timed("start", "post", "/api/game/start", json={"player_position": g % 4})
+            url = f"/api/game/{state['game_id']}"
+            while not state["game_over"]:
+                timed("state", "get", f"{url}/state")
+                timed("state_since", "get", f"{url}/state?since={state['seq']}")
+                timed("get-valid-moves", "get", f"{url}/get-valid-moves")
+                if state["valid_moves"]:
+                    # A side is required for tiles that fit both ends and ignored otherwise
+                    timed("play", "post", f"{url}/play", json={"tile_index": state["valid_moves"][0], "side": "L"})
+                else:
+                    timed("skip", "post", f"{url}/skip")
+                state = timed("state", "get", f"{url}/state")
+            timed("reset", "post", f"{url}/reset")
+    for route, times in timings.items():
+        record(f"api/{route}", len(times) / sum(times), "req/s", True)
+
+
+def compare(baseline_path, tolerance):
+    """Print each result next to the baseline's; True if nothing got worse than tolerance"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    ok = True
+    print(f"\n{'benchmark':55} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, now = baseline[name]["value"], result["value"]
+        change = (now - before) / before
+        worse = -change if result["higher_is_better"] else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        ok = ok and not flag
+        print(f"{name:55} {before:12.2f} {now:12.2f} {change:+8.1%}{flag}")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the engine, strategies and API")
+    parser.add_argument("--games", type=int, default=500, help="games per strategy mix")
+    parser.add_argument("--quick", action="store_true", help="a tenth of the work, for a smoke run")
+    parser.add_argument("--only", choices=["games", "play_turn", "table", "api"], action="append",
+                        help="run only these groups (repeatable)")
+    parser.add_argument("--out", help="save the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with results saved by --out")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="relative slowdown reported as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    n = max(args.games // 10, 10) if args.quick else args.games
+    groups = args.only or ["games", "play_turn", "table", "api"]
+    if "games" in groups:
+        bench_games(n)
+    if "play_turn" in groups:
+        bench_play_turn(max(n // 5, 10))
+    if "table" in groups:
+        bench_table(max(n // 5, 10), 20)
+    if "api" in groups:
+        bench_api(max(n // 10, 5))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+    if args.compare and not compare(args.compare, args.tolerance):
+        sys.exit(1)
@@ -0,0 +1,253 @@
+"""Compact tile encoding for the game engine.
+
+Each of the 28 tiles is a small int id (same order as runme.create_tiles()) and
+each hand is a 28-bit mask. Playability, pip sums and per-number counts come
+from lookup tables; list tiles like [3, 5] only show up at the API/UI boundary
+through to_tile / mask_to_tiles / hand_mask.
+"""
+import random
+
+N_NUMBERS = 7
+TILES = [(i, j) for i in range(N_NUMBERS) for j in range(i, N_NUMBERS)]
+N_TILES = len(TILES)
+FULL_MASK = (1 << N_TILES) - 1
+NAMES = ["A", "B", "C", "D"]
+
+# (a, b) and (b, a) both map to the same id
+TILE_ID = {}
+for _id, (_a, _b) in enumerate(TILES):
+    TILE_ID[(_a, _b)] = _id
+    TILE_ID[(_b, _a)] = _id
+
+TILE_PIPS = [a + b for a, b in TILES]
+IS_DOUBLE = [a == b for a, b in TILES]
+# Distinct numbers on each tile (a double shows one number)
+TILE_NUMBERS = [(a,) if a == b else (a, b) for a, b in TILES]
+# Every tile with a given number on it
+NUMBER_MASK = [sum(1 << t for t, (a, b) in enumerate(TILES) if n in (a, b)) for n in range(N_NUMBERS)]
+DOUBLE_MASK = sum(1 << t for t in range(N_TILES) if IS_DOUBLE[t])
+DOUBLE_ID = [TILE_ID[(n, n)] for n in range(N_NUMBERS)]
+# VOID_MASK[numbers]: every tile showing one of a set of numbers given as a 7-bit mask,
+# i.e. the tiles a player who is void in those numbers can't hold
+VOID_MASK = [sum(1 << t for t, (a, b) in enumerate(TILES) if numbers >> a & 1 or numbers >> b & 1)
+             for numbers in range(1 << N_NUMBERS)]
+# Mask of the tiles playable next to a pair of open ends, indexed [left][right]
+PLAYABLE_MASK = [[NUMBER_MASK[l] | NUMBER_MASK[r] for r in range(N_NUMBERS)] for l in range(N_NUMBERS)]
+# OTHER_END[t][n]: number left open after matching tile t against n, or -1 if it doesn't match
+OTHER_END = [[(b if n == a else a) if n in (a, b) else -1 for n in range(N_NUMBERS)] for a, b in TILES]
+
+# A 28-bit mask is read as four 7-bit chunks; these tables answer each chunk in one lookup
+_CHUNK = 7
+_CHUNK_MASK = (1 << _CHUNK) - 1
+_POPCOUNT = [bin(c).count("1") for c in range(1 << _CHUNK)]
+_PIP_SUM = [[sum(TILE_PIPS[k * _CHUNK + i] for i in range(_CHUNK) if c >> i & 1) for c in range(1 << _CHUNK)]
+            for k in range(N_TILES // _CHUNK)]
+_IDS = [[k * _CHUNK + i for i in range(_CHUNK) if c >> i & 1] for k in range(N_TILES // _CHUNK) for c in range(1 << _CHUNK)]
+
+
+def tile_id(tile):
+    """Id of a [a, b] tile in either orientation"""
+    return TILE_ID[(tile[0], tile[1])]
+
+def to_tile(t):
+    """List form of a tile id, for the API/UI"""
+    a, b = TILES[t]
+    return [a, b]
+
+def hand_mask(tiles):
+    """Mask of a list of [a, b] tiles"""
+    mask = 0
+    for tile in tiles:
+        mask |= 1 << TILE_ID[(tile[0], tile[1])]
+    return mask
+
+def mask_ids(mask):
+    """Tile ids in a mask, in ascending order"""
+    ids = []
+    for k in range(N_TILES // _CHUNK):
+        chunk = mask >> (k * _CHUNK) & _CHUNK_MASK
+        if chunk:
+            ids.extend(_IDS[(k << _CHUNK) | chunk])
+    return ids
+
+def mask_to_tiles(mask):
+    """List form of a hand mask, for the API/UI"""
+    return [to_tile(t) for t in mask_ids(mask)]
+
+def popcount(mask):
+    return (_POPCOUNT[mask & _CHUNK_MASK] + _POPCOUNT[mask >> 7 & _CHUNK_MASK]
+            + _POPCOUNT[mask >> 14 & _CHUNK_MASK] + _POPCOUNT[mask >> 21 & _CHUNK_MASK])
+
+def pip_sum(mask):
+    """Points left in a hand, as Table.count_points"""
+    return (_PIP_SUM[0][mask & _CHUNK_MASK] + _PIP_SUM[1][mask >> 7 & _CHUNK_MASK]
+            + _PIP_SUM[2][mask >> 14 & _CHUNK_MASK] + _PIP_SUM[3][mask >> 21 & _CHUNK_MASK])
+
+def number_count(mask, n):
+    """How many tiles in mask show number n (doubles counted once)"""
+    return popcount(mask & NUMBER_MASK[n])
+
+def playable(mask, left, right):
+    """Tiles of mask that can be played on the given open ends (left is None for an empty table)"""
+    if left is None:
+        return mask
+    return mask & PLAYABLE_MASK[left][right]
+
+def place(t, left, right):
+    """Open ends after playing tile t, using the same side rule as Table.play_tile"""
+    if left is None:
+        return TILES[t]
+    other = OTHER_END[t][left]
+    if other >= 0:
+        return other, right
+    return left, OTHER_END[t][right]
+
+
+# Step 1: Game state
+class BitGame:
+    """A whole game as four hand masks, the open ends and a few counters"""
+    __slots__ = ("hands", "left", "right", "passes", "to_move", "played", "number_counts",
+                 "initial_tile", "turns")
+
+    def __init__(self, hands, left=None, right=None, passes=0, to_move=0):
+        self.hands = list(hands)
+        self.left = left
+        self.right = right
+        self.passes = passes
+        self.to_move = to_move
+        self.played = FULL_MASK
+        for hand in self.hands:
+            self.played &= ~hand
+        if left is None:
+            self.played = 0
+        self.number_counts = [number_count(self.played, n) for n in range(N_NUMBERS)]
+        self.initial_tile = None
+        self.turns = 0
+
+    @classmethod
+    def deal(cls, rng=random):
+        ids = list(range(N_TILES))
+        rng.shuffle(ids)
+        return cls([sum(1 << t for t in ids[7 * i:7 * i + 7]) for i in range(4)])
+
+    def legal(self, player=None):
+        return playable(self.hands[self.to_move if player is None else player], self.left, self.right)
+
+    def play(self, t):
+        """Current player plays tile t and the turn moves on"""
+        if self.left is None and not IS_DOUBLE[t]:
+            # As in Player.play_turn, only an opening that isn't a double is remembered
+            self.initial_tile = t
+        self.hands[self.to_move] &= ~(1 << t)
+        self.played |= 1 << t
+        for n in TILE_NUMBERS[t]:
+            self.number_counts[n] += 1
+        self.left, self.right = place(t, self.left, self.right)
+        self.passes = 0
+        self.to_move = (self.to_move + 1) & 3
+        self.turns += 1
+
+    def pass_turn(self):
+        self.passes += 1
+        self.to_move = (self.to_move + 1) & 3
+        self.turns += 1
+
+    def winner(self):
+        """Winning player index, or None while the game is still going.
+
+        A player who empties their hand wins; a locked game goes to A or B
+        depending on which team holds fewer points, as in runme.simulate_game.
+        """
+        for i in range(4):
+            if not self.hands[i]:
+                return i
+        if self.passes >= 4:
+            team_ac = pip_sum(self.hands[0]) + pip_sum(self.hands[2])
+            team_bd = pip_sum(self.hands[1]) + pip_sum(self.hands[3])
+            return 0 if team_ac < team_bd else 1
+        return None
+
+
+# Step 2: Strategies (same rules as Player.play_turn, on masks)
+def random_policy(game, legal, rng):
+    return rng.choice(mask_ids(legal))
+
+def counted_opening(hand):
+    """First tile by the "AI" heuristic: the one whose numbers we hold most of, doubles counting twice"""
+    counts = [number_count(hand, n) + (hand >> DOUBLE_ID[n] & 1) for n in range(N_NUMBERS)]
+    return max(mask_ids(hand), key=lambda t: counts[TILES[t][0]] + counts[TILES[t][1]])
+
+def ai_policy(game, legal, rng, book=None):
+    """The "AI" heuristic of Player.play_turn scored with lookup tables.
+
+    Terms that are equal for every candidate (the win/lose bonuses) are left
+    out since they can't change the choice. Ties go to the lowest tile id.
+    With book (an opening_book.OpeningBook, e.g. bound with functools.partial)
+    the first play comes from the book where it has the hand.
+    """
+    me = game.to_move
+    hand = game.hands[me]
+    ids = mask_ids(legal)
+    if game.left is None:
+        # First play: the book's tile, or else the tile whose numbers we hold most of
+        hit = book.lookup(hand) if book is not None else None
+        return hit[0] if hit is not None else counted_opening(hand)
+    if len(ids) == 1:
+        return ids[0]
+
+    our_count = [number_count(hand, n) for n in range(N_NUMBERS)]
+    unplayed = [8 - c for c in game.number_counts]
+    our_tiles = popcount(hand) - 1
+    teammate_tiles = popcount(game.hands[(me + 2) & 3])
+    support = teammate_tiles <= 3 and teammate_tiles < our_tiles and game.initial_tile is not None
+    left, right = game.left, game.right
+
+    best, best_score = None, None
+    for t in ids:
+        numbers = TILE_NUMBERS[t]
+        score = 0
+        for n in numbers:
+            score += our_count[n] * 10
+            if unplayed[n] <= 2:
+                score += 5
+        resulting = {left, right}
+        a, b = TILES[t]
+        if a == left or a == right:
+            resulting.add(b)
+        if b == left or b == right:
+            resulting.add(a)
+        score -= 2 * sum(unplayed[n] for n in resulting)
+        if support and any(n in TILES[game.initial_tile] for n in numbers):
+            score += 50
+        if best_score is None or score > best_score:
+            best, best_score = t, score
+    return best
+
+POLICIES = {"Random": random_policy, "AI": ai_policy}
+
+
+def play_out(game, policies, rng=random, double_chance=1.0):
+    """Play game to the end and return the winning player index"""
+    hands = game.hands
+    while True:
+        me = game.to_move
+        legal = playable(hands[me], game.left, game.right)
+        if legal:
+            doubles = legal & DOUBLE_MASK
+            if doubles and (double_chance >= 1 or rng.random() < double_chance):
+                t = rng.choice(mask_ids(doubles)) if doubles & (doubles - 1) else mask_ids(doubles)[0]
+            else:
+                t = policies[me](game, legal, rng)
+            game.play(t)
+            if not hands[me]:
+                return me
+        else:
+            game.pass_turn()
+            if game.passes >= 4:
+                return game.winner()
+
+def simulate_game(strategies=("AI", "AI", "AI", "AI"), rng=random, double_chance=1.0):
+    """Deal and play one game on masks; returns the winner's name"""
+    game = BitGame.deal(rng)
+    policies = [POLICIES[s] for s in strategies]
+    return NAMES[play_out(game, policies, rng, double_chance)]
@@ -0,0 +1,174 @@
+"""Canonical forms and hashes of game states.
+
+Renaming the seven numbers (every 2 a 5 and every 5 a 2, say) turns a position
+into one that plays out the same way, apart from the pip counts that decide a
+locked game. So does reading the line of play from the other end, and so does
+moving every player two seats round the table (the teams stay the same). The
+canonical form of a position is the smallest packed state (solver.pack_state)
+reachable through those symmetries, so caches keyed on it share one entry per
+class of equivalent positions:
+
+    key, renaming, shift = canonical_state(hands, left, right, passes, to_move)
+    ...                                     # look up or solve the canonical position
+    move = original_move(canonical_move, renaming, left, right)
+
+Locked games are scored on pips, which renaming doesn't keep, so a result
+only carries over between renamed positions when it doesn't depend on who wins
+a lock (see solver.Solver(locks=...) and tablebase.py).
+
+The Zobrist keys give every position a 64-bit hash, and zobrist_play and
+zobrist_pass update it a move at a time for a cache that follows one game:
+
+    h = zobrist(game.hands, game.left, game.right, game.passes, game.to_move)
+    h = zobrist_play(h, game.to_move, t, game.left, game.right, game.passes)
+    game.play(t)
+"""
+import itertools
+import random
+
+from bitboard import FULL_MASK, N_NUMBERS, N_TILES, TILE_ID, TILES, mask_ids, place
+from solver import pack_state
+
+# Zobrist keys, from a fixed seed so hashes are the same in every process
+_zobrist_rng = random.Random("domino-zobrist")
+HAND_KEYS = [[_zobrist_rng.getrandbits(64) for _ in range(N_TILES)] for _ in range(4)]
+PLAYED_KEYS = [_zobrist_rng.getrandbits(64) for _ in range(N_TILES)]
+# One key per pair of open ends, the same whichever end is which
+END_KEYS = [[0] * N_NUMBERS for _ in range(N_NUMBERS)]
+for _l in range(N_NUMBERS):
+    for _r in range(_l, N_NUMBERS):
+        END_KEYS[_l][_r] = END_KEYS[_r][_l] = _zobrist_rng.getrandbits(64)
+# 0 to 4 passes in a row, the last a locked game
+PASS_KEYS = [_zobrist_rng.getrandbits(64) for _ in range(5)]
+TO_MOVE_KEYS = [_zobrist_rng.getrandbits(64) for _ in range(4)]
+
+
+def zobrist(hands, left, right, passes, to_move):
+    """64-bit hash of a position: hands, played tiles, open ends, passes and player to move.
+
+    Every key is XORed in, so a move changes it by the keys of the tile moving from
+    hand to table, of the old and new ends, and of the passes and player to move.
+    """
+    h = PASS_KEYS[passes] ^ TO_MOVE_KEYS[to_move]
+    held = 0
+    for p, hand in enumerate(hands):
+        held |= hand
+        for t in mask_ids(hand):
+            h ^= HAND_KEYS[p][t]
+    if left is not None:
+        h ^= END_KEYS[left][right]
+        for t in mask_ids(FULL_MASK & ~held):
+            h ^= PLAYED_KEYS[t]
+    return h
+
+def zobrist_play(h, player, t, left, right, passes):
+    """zobrist of the position after player plays tile t, from h before it, when the
+    ends were left and right (None on an empty table) after passes passes in a row"""
+    new_left, new_right = place(t, left, right)
+    h ^= HAND_KEYS[player][t] ^ PLAYED_KEYS[t] ^ END_KEYS[new_left][new_right]
+    if left is not None:
+        h ^= END_KEYS[left][right]
+    return h ^ PASS_KEYS[passes] ^ PASS_KEYS[0] ^ TO_MOVE_KEYS[player] ^ TO_MOVE_KEYS[(player + 1) & 3]
+
+def zobrist_pass(h, player, passes):
+    """zobrist of the position after player passes, from h before it and the passes in a row so far"""
+    return h ^ PASS_KEYS[passes] ^ PASS_KEYS[passes + 1] ^ TO_MOVE_KEYS[player] ^ TO_MOVE_KEYS[(player + 1) & 3]
+
+
+def _renamings(tiles, extra):
+    """Every renaming (list: number -> new number) that keeps the numbers sorted by an
+    invariant of how they appear in tiles, with extra[n] breaking ties first"""
+    degree = [0] * N_NUMBERS
+    for a, b in tiles:
+        degree[a] += 1
+        degree[b] += 1
+    neighbours = [[] for _ in range(N_NUMBERS)]
+    doubles = [0] * N_NUMBERS
+    for a, b in tiles:
+        if a == b:
+            doubles[a] += 1
+        else:
+            neighbours[a].append(degree[b])
+            neighbours[b].append(degree[a])
+    signature = [(extra[n], -degree[n], -doubles[n], sorted(neighbours[n], reverse=True))
+                 for n in range(N_NUMBERS)]
+    order = sorted(range(N_NUMBERS), key=lambda n: signature[n])
+    groups = [list(group) for _, group in itertools.groupby(order, key=lambda n: signature[n])]
+    # Numbers that show up nowhere can keep their order; swapping them changes nothing
+    choices = [itertools.permutations(group) if degree[group[0]] or any(extra[group[0]]) else [group]
+               for group in groups]
+    renaming = [0] * N_NUMBERS
+    for arrangement in itertools.product(*choices):
+        label = 0
+        for group in arrangement:
+            for n in group:
+                renaming[n] = label
+                label += 1
+        yield renaming
+
+def canonical_hand(hand):
+    """(key, renaming) for a hand mask: key is the smallest mask any renaming of the
+    numbers gives, and renaming[n] the number n becomes to get it.
+
+    Only renamings that keep the numbers sorted by how they sit in the hand (how
+    many tiles show them, the double, their neighbours) are tried, which is few
+    for almost every hand.
+    """
+    tiles = [TILES[t] for t in mask_ids(hand)]
+    best_key, best_renaming = None, None
+    for renaming in _renamings(tiles, [()] * N_NUMBERS):
+        key = 0
+        for a, b in tiles:
+            key |= 1 << TILE_ID[(renaming[a], renaming[b])]
+        if best_key is None or key < best_key:
+            best_key, best_renaming = key, list(renaming)
+    return best_key, best_renaming
+
+def canonical_state(hands, left, right, passes, to_move):
+    """(key, renaming, shift) for a position with tiles on the table.
+
+    key is pack_state of the canonical position, reached by moving every seat
+    back shift (0 or 2) places and renaming each number n to renaming[n].
+    Values for the team to move carry over unchanged when they don't depend
+    on how locks are scored.
+    """
+    shift = to_move & 2
+    if shift:
+        hands = hands[2:] + hands[:2]
+        to_move -= 2
+    seated = [[TILES[t] for t in mask_ids(hand)] for hand in hands]
+    tiles = [tile for hand in seated for tile in hand]
+    # Ends and who holds each number set numbers apart before their shape in the hands does
+    extra = [[0] * 5 for _ in range(N_NUMBERS)]
+    extra[left][0] -= 1
+    extra[right][0] -= 1
+    for p, hand in enumerate(seated):
+        for a, b in hand:
+            extra[a][p + 1] -= 1
+            extra[b][p + 1] -= 1
+
+    best_key, best_renaming = None, None
+    for renaming in _renamings(tiles, extra):
+        renamed = [0, 0, 0, 0]
+        for p, hand in enumerate(seated):
+            for a, b in hand:
+                renamed[p] |= 1 << TILE_ID[(renaming[a], renaming[b])]
+        key = pack_state(renamed, renaming[left], renaming[right], passes, to_move)
+        if best_key is None or key < best_key:
+            best_key, best_renaming = key, list(renaming)
+    return best_key, best_renaming, shift
+
+def original_move(move, renaming, left, right):
+    """A (tile id, side) move of the canonical position as a move of the original one,
+    whose open ends are left and right. None (a pass) stays None."""
+    if move is None:
+        return None
+    t, side = move
+    back = [0] * N_NUMBERS
+    for n, label in enumerate(renaming):
+        back[label] = n
+    a, b = TILES[t]
+    # The canonical position has its ends in packed order, lower first
+    if side is not None and renaming[left] > renaming[right]:
+        side = 'L' if side == 'R' else 'R'
+    return TILE_ID[(back[a], back[b])], side
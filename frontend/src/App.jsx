@@ -1,10 +1,82 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import './App.css';
 import GameBoard from './components/GameBoard';
 import PlayerHand from './components/PlayerHand';
 import GameInfo from './components/GameInfo';
 import StartMenu from './components/StartMenu';
 
+// Fold one server event into the game state; events we've already seen are ignored
+function applyEvent(state, event) {
+  if (!state || event.seq <= state.seq) return state;
+  const index = state.players.findIndex((p) => p.name === event.player);
+  const next = { ...state, seq: event.seq };
+
+  if (event.type === 'tile_played') {
+    const tile = event.tile;
+    let table;
+    let playable;
+    if (state.table.length === 0) {
+      table = [tile];
+      playable = [tile[0], tile[1]];
+    } else if (event.side === 'L') {
+      table = [tile, ...state.table];
+      playable = [tile[0], state.playable_numbers[1]];
+    } else {
+      table = [...state.table, tile];
+      playable = [state.playable_numbers[0], tile[1]];
+    }
+    next.table = table;
+    next.playable_numbers = playable;
+    next.players = state.players.map((p, i) => {
+      if (i !== index) return p;
+      const at = p.tiles.findIndex((t) =>
+        (t[0] === tile[0] && t[1] === tile[1]) || (t[0] === tile[1] && t[1] === tile[0]));
+      const tiles = at >= 0 ? p.tiles.filter((_, j) => j !== at) : p.tiles;
+      return { ...p, tiles, tile_count: p.tile_count - 1 };
+    });
+    next.passes = 0;
+    next.game_history = [...state.game_history, {
+      player: event.player,
+      action: 'played',
+      tile,
+      reasoning: `Player ${event.player} played tile [${tile.join(', ')}]`
+    }].slice(-3);
+  } else if (event.type === 'pass') {
+    next.passes = state.passes + 1;
+    next.game_history = [...state.game_history, {
+      player: event.player,
+      action: 'passed',
+      tile: null,
+      reasoning: `Player ${event.player} has no valid moves`
+    }].slice(-3);
+  } else if (event.type === 'game_over') {
+    next.game_over = true;
+    next.winner = event.winner;
+    next.game_locked = event.game_locked;
+    next.turn_count = event.turn_count;
+    next.passes = event.passes;
+    next.current_player_index = event.current_player_index;
+    next.current_player = state.players[event.current_player_index].name;
+    next.team_ac_points = event.team_ac_points;
+    next.team_bd_points = event.team_bd_points;
+    next.players = state.players.map((p, i) => ({
+      ...p,
+      tiles: event.hands[i],
+      tile_count: event.hands[i].length,
+      is_current: i === event.current_player_index
+    }));
+    return next;
+  }
+
+  // Play moves on to the next player
+  const current = (index + 1) % state.players.length;
+  next.turn_count = state.turn_count + 1;
+  next.current_player_index = current;
+  next.current_player = state.players[current].name;
+  next.players = next.players.map((p, i) => ({ ...p, is_current: i === current }));
+  return next;
+}
+
 function App() {
   const [gameState, setGameState] = useState(null);
   const [loading, setLoading] = useState(false);
@@ -13,37 +85,37 @@ function App() {
   const [selectedTile, setSelectedTile] = useState(null);
   const [ambiguousTileInfo, setAmbiguousTileInfo] = useState(null);
   const [validMoves, setValidMoves] = useState([]);
+  const [ambiguousTiles, setAmbiguousTiles] = useState([]);
   const [playerPosition, setPlayerPosition] = useState(null);
+  const [gameId, setGameId] = useState(null);
 
   const API_URL = '/api';
+  const gameUrl = (id) => `${API_URL}/game/${id}`;
 
-  // Fetch game state
-  const fetchGameState = async () => {
-    try {
-      const response = await fetch(`${API_URL}/game/state`);
-      if (!response.ok) throw new Error('Failed to fetch game state');
-      const data = await response.json();
-      setGameState(data);
-      setError(null);
-      await fetchValidMoves();
-    } catch (err) {
-      setError(err.message);
-    }
+  // Every response carries the moves we may make next
+  const setMoves = (data) => {
+    setValidMoves(data.valid_moves);
+    setAmbiguousTiles(data.ambiguous_tiles);
   };
 
-  // Fetch valid moves
-  const fetchValidMoves = async () => {
-    try {
-      const response = await fetch(`${API_URL}/game/get-valid-moves`);
-      if (!response.ok) throw new Error('Failed to fetch valid moves');
-      const data = await response.json();
-      setValidMoves(data.valid_moves);
-      return data;
-    } catch (err) {
-      setError(err.message);
-    }
+  const applyEvents = (events) => {
+    setGameState((state) => events.reduce(applyEvent, state));
   };
 
+  // Follow the game's events as the server pushes them
+  useEffect(() => {
+    if (!gameId || !gameState) return undefined;
+    const source = new EventSource(`${gameUrl(gameId)}/events?since=${gameState.seq}`);
+    source.onmessage = (message) => {
+      const event = JSON.parse(message.data);
+      applyEvents([event]);
+      if (event.type === 'game_over') source.close();
+    };
+    return () => source.close();
+    // Subscribe once per game; later events arrive on this stream
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [gameId]);
+
   // Start a new game
   const startNewGame = async (playerPosition) => {
     setLoading(true);
@@ -64,10 +136,11 @@ function App() {
       const data = await response.json();
       console.log('Game started:', data);
       setGameState(data);
+      setMoves(data);
+      setGameId(data.game_id);
       setPlayerPosition(playerPosition);
       setGameStarted(true);
       setSelectedTile(null);
-      await fetchValidMoves();
     } catch (err) {
       console.error('Error starting game:', err);
       setError(`Failed to start game: ${err.message}. Make sure the Flask server is running on http://localhost:5001`);
@@ -80,26 +153,19 @@ function App() {
   const playTile = async (tileIndex, side = null) => {
     setLoading(true);
     try {
-      const response = await fetch(`${API_URL}/game/play`, {
+      const response = await fetch(`${gameUrl(gameId)}/play`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ tile_index: tileIndex, side })
       });
       if (!response.ok) throw new Error('Failed to play tile');
+      // The response carries this move and the AI replies; the stream may already have delivered them
       const data = await response.json();
-      setGameState(data.game_state);
+      applyEvents(data.events);
+      setMoves(data);
       setError(null);
       setSelectedTile(null);
       setAmbiguousTileInfo(null);
-      
-      // Auto-refresh if not the player's turn
-      if (data.game_state.current_player !== 'A' && data.game_state.current_player !== 'C') {
-        setTimeout(() => {
-          fetchGameState();
-        }, 1000);
-      } else {
-        await fetchValidMoves();
-      }
     } catch (err) {
       setError(err.message);
     } finally {
@@ -111,18 +177,16 @@ function App() {
   const skipTurn = async () => {
     setLoading(true);
     try {
-      const response = await fetch(`${API_URL}/game/skip`, {
+      const response = await fetch(`${gameUrl(gameId)}/skip`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' }
       });
       if (!response.ok) throw new Error('Failed to skip turn');
       const data = await response.json();
-      setGameState(data.game_state);
+      applyEvents(data.events);
+      setMoves(data);
       setError(null);
       setSelectedTile(null);
-      
-      // Refresh valid moves for the next player
-      await fetchValidMoves();
     } catch (err) {
       setError(err.message);
     } finally {
@@ -137,8 +201,7 @@ function App() {
     setSelectedTile(index);
 
     // Check if this tile is ambiguous (can play on both sides)
-    const validMovesData = await fetchValidMoves();
-    if (validMovesData && validMovesData.ambiguous_tiles.includes(index)) {
+    if (ambiguousTiles.includes(index)) {
       setAmbiguousTileInfo(index);
     } else {
       setAmbiguousTileInfo(null);
@@ -155,8 +218,11 @@ function App() {
 
   // Reset game
   const handleResetGame = async () => {
-    await fetch(`${API_URL}/game/reset`, { method: 'POST' });
+    if (gameId) {
+      await fetch(`${gameUrl(gameId)}/reset`, { method: 'POST' });
+    }
     setGameStarted(false);
+    setGameId(null);
     setGameState(null);
     setPlayerPosition(null);
     setSelectedTile(null);
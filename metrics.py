@@ -0,0 +1,91 @@
+"""Request metrics and logging for the API servers.
+
+Every request is counted and its latency added to a histogram per route, which
+GET /metrics serves in the Prometheus text format. Recording is a lock, a
+bisect and a few additions; nothing is written anywhere on the request path.
+
+Request lines go through the "domino.api" logger and are off by default:
+
+    DOMINO_LOG_LEVEL=INFO DOMINO_LOG_SAMPLE=0.01 python api.py
+
+logs one request in a hundred (DOMINO_LOG_SAMPLE defaults to 1, i.e. every
+request once INFO is enabled; at DEBUG every request is logged). Where the
+lines go is up to whoever runs the app: api.py and async_api.py send them to
+stderr with logging.basicConfig when run directly.
+"""
+import logging
+import os
+import random
+import threading
+from bisect import bisect_left
+
+logger = logging.getLogger("domino.api")
+logger.setLevel(os.environ.get("DOMINO_LOG_LEVEL", "WARNING").upper())
+# For the servers' logging.basicConfig
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+LOG_SAMPLE = float(os.environ.get("DOMINO_LOG_SAMPLE", "1"))
+
+# Upper bounds of the latency buckets, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class RouteStats:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # Last one is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.statuses = {}
+
+
+class Metrics:
+    """Request counts and latency histograms keyed by (method, route)"""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method, route, status, seconds):
+        key = (method, route)
+        with self._lock:
+            stats = self._routes.get(key)
+            if stats is None:
+                stats = self._routes[key] = RouteStats()
+            stats.buckets[bisect_left(BUCKETS, seconds)] += 1
+            stats.count += 1
+            stats.total += seconds
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def render(self):
+        """Everything recorded so far, in the Prometheus text exposition format"""
+        lines = [
+            "# HELP domino_requests_total Requests handled, by route and status.",
+            "# TYPE domino_requests_total counter",
+        ]
+        with self._lock:
+            routes = sorted(self._routes.items())
+            for (method, route), stats in routes:
+                for status, n in sorted(stats.statuses.items()):
+                    lines.append(f'domino_requests_total{{method="{method}",route="{route}",status="{status}"}} {n}')
+            lines.append("# HELP domino_request_seconds Time to handle a request, by route.")
+            lines.append("# TYPE domino_request_seconds histogram")
+            for (method, route), stats in routes:
+                labels = f'method="{method}",route="{route}"'
+                cumulative = 0
+                for bound, n in zip(BUCKETS + ("+Inf",), stats.buckets):
+                    cumulative += n
+                    lines.append(f'domino_request_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"domino_request_seconds_sum{{{labels}}} {stats.total:.6f}")
+                lines.append(f"domino_request_seconds_count{{{labels}}} {stats.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def record_request(method, route, status, seconds, path=None):
+    """Count a finished request and, if logging is on for it, log it"""
+    metrics.observe(method, route, status, seconds)
+    if logger.isEnabledFor(logging.DEBUG) or (
+            logger.isEnabledFor(logging.INFO) and (LOG_SAMPLE >= 1 or random.random() < LOG_SAMPLE)):
+        logger.info("%s %s %s %.1fms", method, path or route, status, seconds * 1000)
@@ -0,0 +1,221 @@
+"""Durable storage for the games served by api.py.
+
+A game is stored as the deal it started from plus an append-only log of the
+moves played since, and is rebuilt by replaying the log (see
+api.restore_game). Writes go through a queue to a background thread that
+commits whatever has piled up in one transaction, so a request only pays for
+putting its moves on the queue.
+
+Moves are plain INSERTs keyed on (game id, seq), so when two processes hold
+copies of one game, the second to log a move under the same number fails
+instead of overwriting the first. The backend then marks that game stale
+and drops its later writes, and api.find_game reloads it from the log.
+
+The backend is chosen with DOMINO_STORE, e.g. DOMINO_STORE=sqlite:games.db;
+without it nothing is stored and games live only in memory.
+"""
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from metrics import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    deal TEXT NOT NULL,        -- JSON: name, strategy and starting tiles of each player
+    initial_tile TEXT          -- JSON tile the AI strategies remember as the opening
+);
+CREATE TABLE IF NOT EXISTS moves (
+    game_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    action TEXT NOT NULL,      -- "play" or "pass"
+    tile TEXT,                 -- JSON tile as placed on the table
+    side TEXT,                 -- "L" or "R"
+    quiet INTEGER NOT NULL DEFAULT 0,  -- 1 if the play was left out of the table's play history
+    PRIMARY KEY (game_id, seq)
+);
+"""
+
+
+class NullBackend:
+    """Stores nothing; the default"""
+
+    def save_game(self, game_id, deal):
+        pass
+
+    def append(self, game_id, events, initial_tile=None):
+        pass
+
+    def load(self, game_id):
+        return None
+
+    def stale(self, game_id):
+        return False
+
+    def delete(self, game_id):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SqliteBackend:
+    """Deal snapshots and move logs in one SQLite file, written in batches"""
+
+    def __init__(self, path, batch_interval=0.02, max_batch=1000):
+        self.path = path
+        self.batch_interval = batch_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()  # (game_id, sql, params) writes, None to stop
+        # game_id -> writes queued but not yet committed, so a load waits for its own game only
+        self._pending = {}
+        self._pending_cond = threading.Condition()
+        # Games whose copy in this process clashed with the stored log; changed under _pending_cond
+        self._stale = set()
+        db = self._connect()
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+        self._writer = threading.Thread(target=self._write_loop, name="game-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        # WAL lets other workers read while this one writes
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _put(self, game_id, sql, params):
+        with self._pending_cond:
+            self._pending[game_id] = self._pending.get(game_id, 0) + 1
+        self._queue.put((game_id, sql, params))
+
+    def save_game(self, game_id, deal):
+        self._put(game_id, "INSERT OR REPLACE INTO games (game_id, created, deal) VALUES (?, ?, ?)",
+                  (game_id, time.time(), json.dumps(deal)))
+
+    def append(self, game_id, events, initial_tile=None):
+        """Log the tile_played and pass events of a game (their seq numbers the rows)"""
+        for event in events:
+            if event["type"] == "tile_played":
+                row = (game_id, event["seq"], event["player"], "play", json.dumps(event["tile"]), event["side"],
+                       int(event.get("quiet", False)))
+            elif event["type"] == "pass":
+                row = (game_id, event["seq"], event["player"], "pass", None, None, 0)
+            else:
+                continue
+            self._put(game_id, "INSERT INTO moves VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+        if initial_tile is not None:
+            self._put(game_id, "UPDATE games SET initial_tile = ? WHERE game_id = ?",
+                      (json.dumps(list(initial_tile)), game_id))
+
+    def delete(self, game_id):
+        with self._pending_cond:
+            self._stale.discard(game_id)
+        self._put(game_id, "DELETE FROM moves WHERE game_id = ?", (game_id,))
+        self._put(game_id, "DELETE FROM games WHERE game_id = ?", (game_id,))
+
+    def load(self, game_id):
+        """(deal, initial tile, moves in order) for a stored game, or None"""
+        self.flush_game(game_id)
+        with self._pending_cond:
+            # Whoever loads the game now replaces the stale copy
+            self._stale.discard(game_id)
+        db = self._connect()
+        try:
+            row = db.execute("SELECT deal, initial_tile FROM games WHERE game_id = ?", (game_id,)).fetchone()
+            if row is None:
+                return None
+            moves = [{"seq": seq, "player": player, "action": action,
+                      "tile": json.loads(tile) if tile else None, "side": side, "quiet": bool(quiet)}
+                     for seq, player, action, tile, side, quiet in db.execute(
+                         "SELECT seq, player, action, tile, side, quiet FROM moves WHERE game_id = ? ORDER BY seq",
+                         (game_id,))]
+        finally:
+            db.close()
+        return json.loads(row[0]), json.loads(row[1]) if row[1] else None, moves
+
+    def stale(self, game_id):
+        """True if a move this process logged for the game clashed with one another
+        process stored first: the copy in memory is out of date and should be reloaded"""
+        with self._pending_cond:
+            return game_id in self._stale
+
+    def flush_game(self, game_id):
+        """Wait until the writes queued so far for one game are committed"""
+        with self._pending_cond:
+            self._pending_cond.wait_for(lambda: game_id not in self._pending)
+
+    def flush(self):
+        """Wait until everything queued so far is committed"""
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._writer.join()
+
+    def _write_loop(self):
+        db = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            # Let a burst of moves build up, then commit it all at once
+            time.sleep(self.batch_interval)
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+            try:
+                with db:
+                    for game_id, sql, params in batch:
+                        if game_id in self._stale:
+                            continue
+                        try:
+                            db.execute(sql, params)
+                        except sqlite3.IntegrityError:
+                            logger.error("Game %s: a move clashed with one already stored, "
+                                         "dropping this copy's writes until it is reloaded", game_id)
+                            with self._pending_cond:
+                                self._stale.add(game_id)
+            except sqlite3.Error:
+                logger.exception("Failed to store a batch of %d game writes", len(batch))
+            finally:
+                with self._pending_cond:
+                    for game_id, _, _ in batch:
+                        self._pending[game_id] -= 1
+                        if not self._pending[game_id]:
+                            del self._pending[game_id]
+                    self._pending_cond.notify_all()
+                for _ in batch:
+                    self._queue.task_done()
+        db.close()
+
+
+def open_backend(spec):
+    """Backend for a DOMINO_STORE value: "" for none, "sqlite:<path>" for SQLite"""
+    if not spec:
+        return NullBackend()
+    kind, _, path = spec.partition(":")
+    if kind == "sqlite":
+        return SqliteBackend(path or "games.db")
+    raise ValueError(f"Unknown game store {spec!r}")
@@ -0,0 +1,182 @@
+"""Determinized Monte Carlo (PIMC) move choice for imperfect information.
+
+The player only sees their own tiles, the table and who passed on which open
+numbers. For each sample we deal the unseen tiles to the other players in a way
+that fits those observations, play every candidate move out to the end with the
+bitboard engine, and keep the move with the best average result for our team.
+
+Sampling is bounded by a sample count and a time budget per move, and can be
+spread over a process pool.
+"""
+import itertools
+import multiprocessing
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import (BitGame, DOUBLE_MASK, FULL_MASK, IS_DOUBLE, POLICIES, hand_mask, mask_ids, place, playable,
+                      popcount, play_out, tile_id)
+from solver import legal_moves
+
+# Worker count -> process pool, shared by every PIMC player in this process. Pools are
+# never swapped out, since another thread may be mapping over one; _executors_lock
+# keeps two threads from starting a pool for the same count.
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    """Process pool with this many workers shared by every PIMC player in this process"""
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            # Spawned, not forked: the API calls this from a threaded server, and a forked
+            # child would inherit whatever locks the other threads held at that moment
+            executor = _executors[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return executor
+
+def _can_deal(pool, need, forbidden):
+    """True if the tiles in pool can go to the players in need (player -> tiles still to
+    deal them): every group of them may hold at least as many as the group needs"""
+    players = list(need)
+    for k in range(1, len(players) + 1):
+        for group in itertools.combinations(players, k):
+            allowed = 0
+            for p in group:
+                allowed |= pool & ~forbidden[p]
+            if popcount(allowed) < sum(need[p] for p in group):
+                return False
+    return True
+
+def sample_hands(me, my_hand, sizes, unseen, forbidden, rng, tries=50):
+    """Deal the unseen tiles to the other players, or None if no deal fits the voids.
+
+    sizes[p] is how many tiles player p holds and forbidden[p] the tiles they
+    can't have. Deals are drawn at random, the most constrained players first;
+    when voids are so tight that tries draws all fail, the tiles are handed
+    out one at a time instead, each to a random player who can take it
+    without leaving the rest impossible to deal.
+    """
+    others = sorted((p for p in range(4) if p != me),
+                    key=lambda p: popcount(unseen & ~forbidden[p]) - sizes[p])
+    for _ in range(tries):
+        pool = unseen
+        hands = [0, 0, 0, 0]
+        hands[me] = my_hand
+        for p in others:
+            allowed = mask_ids(pool & ~forbidden[p])
+            if len(allowed) < sizes[p]:
+                break
+            for t in rng.sample(allowed, sizes[p]):
+                hands[p] |= 1 << t
+                pool &= ~(1 << t)
+        else:
+            if not pool:
+                return hands
+
+    need = {p: sizes[p] for p in others}
+    if popcount(unseen) != sum(need.values()) or not _can_deal(unseen, need, forbidden):
+        return None
+    hands = [0, 0, 0, 0]
+    hands[me] = my_hand
+    pool = unseen
+    ids = mask_ids(unseen)
+    rng.shuffle(ids)
+    for t in ids:
+        pool &= ~(1 << t)
+        takers = [p for p in others if need[p] and not forbidden[p] >> t & 1]
+        rng.shuffle(takers)
+        # Some taker always works: the tile's holder in any deal that fits what's left
+        for p in takers:
+            need[p] -= 1
+            if _can_deal(pool, need, forbidden):
+                break
+            need[p] += 1
+        hands[p] |= 1 << t
+    return hands
+
+def _rollouts(args):
+    """Play out every candidate move on freshly sampled deals; returns (wins per move, samples).
+
+    At least one sample is played even if the deadline has passed, so every job counts.
+    """
+    me, my_hand, sizes, unseen, forbidden, moves, initial_tile, seed, n_samples, deadline, policy = args
+    rng = random.Random(seed)
+    policies = [POLICIES[policy]] * 4
+    wins = [0] * len(moves)
+    done = 0
+    while done < n_samples and (not done or time.time() < deadline):
+        hands = sample_hands(me, my_hand, sizes, unseen, forbidden, rng)
+        if hands is None:
+            break
+        for i, (t, side, l, r) in enumerate(moves):
+            child = list(hands)
+            child[me] &= ~(1 << t)
+            if not child[me]:
+                wins[i] += 1
+                continue
+            game = BitGame(child, l, r, to_move=(me + 1) & 3)
+            # As in BitGame.play, an opening double isn't remembered
+            game.initial_tile = t if side is None and not IS_DOUBLE[t] else initial_tile
+            if play_out(game, policies, rng) % 2 == me % 2:
+                wins[i] += 1
+        done += 1
+    return wins, done
+
+def choose_move(me, players, table, rng=random, samples=64, time_budget=0.25, workers=0, policy="AI"):
+    """Best (tile, side) for players[me] by determinized rollouts, or None if they must pass.
+
+    side is 'L'/'R' (None on an empty table). Sampled deals respect the numbers
+    each player's passes show they lack (table.void_tiles).
+    """
+    my_hand = hand_mask(players[me].tiles)
+    left, right = table.left_end, table.right_end
+    moves = legal_moves(my_hand, left, right)
+    if not moves:
+        return None
+    if len(moves) > 1:
+        sizes = [len(p.tiles) for p in players]
+        unseen = FULL_MASK & ~my_hand & ~hand_mask(table.played_tiles)
+        forbidden = [table.void_tiles(p.name) for p in players]
+        forbidden[me] = 0
+        initial = table.context.initial_tile
+        initial = tile_id(initial) if initial else None
+        deadline = time.time() + time_budget
+
+        if workers and workers > 1:
+            per_worker = -(-samples // workers)
+            jobs = [(me, my_hand, sizes, unseen, forbidden, moves, initial, rng.getrandbits(64),
+                     per_worker, deadline, policy) for _ in range(workers)]
+            results = list(_get_executor(workers).map(_rollouts, jobs))
+        else:
+            results = [_rollouts((me, my_hand, sizes, unseen, forbidden, moves, initial,
+                                  rng.getrandbits(64), samples, deadline, policy))]
+        if not sum(done for _, done in results):
+            # No deal fits the voids, so nothing was played out: fall back to the "AI" heuristic
+            return _heuristic_move(me, my_hand, sizes, unseen, left, right, initial, moves, rng)
+        wins = [sum(w[i] for w, _ in results) for i in range(len(moves))]
+        best = max(range(len(moves)), key=lambda i: wins[i])
+    else:
+        best = 0
+    t, side = moves[best][0], moves[best][1]
+    return t, side
+
+def _heuristic_move(me, my_hand, sizes, unseen, left, right, initial, moves, rng):
+    """(tile id, side) the "AI" strategy plays, doubles first as in play_out. It only
+    looks at the other hands' sizes, so any deal of the unseen tiles will do."""
+    hands = [0, 0, 0, 0]
+    hands[me] = my_hand
+    ids = mask_ids(unseen)
+    for p in range(4):
+        if p != me:
+            hands[p] = sum(1 << t for t in ids[:sizes[p]])
+            ids = ids[sizes[p]:]
+    game = BitGame(hands, left, right, to_move=me)
+    game.initial_tile = initial
+    legal = playable(my_hand, left, right)
+    doubles = legal & DOUBLE_MASK
+    t = rng.choice(mask_ids(doubles)) if doubles else POLICIES["AI"](game, legal, rng)
+    # The side Table.play_tile picks when it isn't forced
+    return next((m[0], m[1]) for m in moves if m[0] == t and m[2:] == place(t, left, right))
@@ -1,78 +1,205 @@
 import random
+import argparse
+import time
+from collections import deque
+from multiprocessing import Pool
+import bitboard
+import opening_book
+import pimc
+import tablebase
+from stats import SimulationStats
 n_sims = 1000
-chance_of_playing_double=1
 
-
-initial_tile = None
 # Step 1: Create the tiles
 def create_tiles():
     return [[i, j] for i in range(7) for j in range(i, 7)]
 
+# Per-game settings and state shared by the players of one game. Keeping them here
+# instead of in module globals lets any number of games run side by side.
+class GameContext:
+    def __init__(self, chance_of_playing_double=1, pimc_samples=64, pimc_time_budget=0.25, pimc_workers=0,
+                 book=None, endgame=True, endgame_samples=32):
+        self.chance_of_playing_double = chance_of_playing_double
+        self.initial_tile = None  # Opening tile, recorded by the "Win" and "AI" strategies
+        # First moves of the "Win" and "AI" strategies (see opening_book.py): True for the
+        # default book when there is one, or an OpeningBook, or None to work them out.
+        # Off by default: the book is slower than counting and hasn't won more games yet
+        self.book = opening_book.default_book() if book is True else book
+        # Endgame tablebase the "AI" strategy plays from once few tiles are left (see
+        # tablebase.py): True for the shared default, or a Tablebase, or None to not use one;
+        # endgame_samples caps the deals of the unseen tiles it weighs per move. On for
+        # served games; simulations (play_game, simulate_batch) leave it off unless asked
+        self.tablebase = tablebase.default_tablebase() if endgame is True else endgame
+        self.endgame_samples = endgame_samples
+        # "PIMC" strategy budget per move: sampled deals, seconds, and worker processes (0 = in-process)
+        self.pimc_samples = pimc_samples
+        self.pimc_time_budget = pimc_time_budget
+        self.pimc_workers = pimc_workers
+
+# What each player and team has shown by the tiles they played, for the "Help" and
+# "Block" strategies, which read a player's strong numbers off their plays with the
+# earlier tiles counting more: the i-th tile adds 1 / (i + 1) to each of its numbers.
+# Table.play_tile folds every recorded play in as it happens, so reading a profile
+# costs the same on the last turn as on the first.
+class PlayProfiles:
+    def __init__(self):
+        self.played = {}    # Player name or team -> tiles played, in order
+        # Player name or team -> weight of each number, and the same with every tile
+        # one place further down the list (for when a strategy puts the opening tile first)
+        self._weights = {}
+        self.opener = None  # Player whose recorded play opened the line
+
+    def add(self, player_name, tile, opening=False):
+        if opening:
+            self.opener = player_name
+        team = "AC" if player_name in ["A", "C"] else "BD"
+        for key in (player_name, team):
+            tiles = self.played.get(key)
+            if tiles is None:
+                tiles = self.played[key] = []
+                self._weights[key] = ([0.0] * 7, [0.0] * 7)
+            weights, shifted = self._weights[key]
+            weight = 1.0 / (len(tiles) + 1)
+            next_weight = 1.0 / (len(tiles) + 2)
+            for number in tile:
+                weights[number] += weight
+                shifted[number] += next_weight
+            tiles.append(tile)
+
+    def weights(self, key, first=None):
+        """Weight of each number over the tile first, if given, then key's plays.
+
+        A list of 7, shared with the profile when first is None, so don't change it.
+        """
+        if key not in self._weights:
+            weights, shifted = NO_WEIGHTS, NO_WEIGHTS
+        else:
+            weights, shifted = self._weights[key]
+        if first is None:
+            return weights
+        weights = shifted.copy()
+        for number in first:
+            weights[number] += 1.0
+        return weights
+
+NO_WEIGHTS = [0.0] * 7
+
 # Step 2: Create the Table class
 class Table:
-    def __init__(self):
-        self.played_tiles = []
+    def __init__(self, context=None):
+        self.context = context if context is not None else GameContext()
+        # Line of play, left to right; a deque so both ends are O(1) to extend
+        self.played_tiles = deque()
+        self.left_end = None   # Open number on the left end of the line
+        self.right_end = None  # Open number on the right end of the line
         self.play_history = []  # List of (player_name, tile) tuples
+        self.pass_history = []  # List of (player_name, open numbers they couldn't follow)
+        # Player name -> 7-bit mask of the numbers their passes show they don't hold
+        self.voids = {}
+        self.profiles = PlayProfiles()  # Running summary of play_history, see PlayProfiles
+        # Running count of played tiles showing each number (doubles counted once),
+        # kept up to date by play_tile so nobody has to rescan the table
+        self.number_counts = [0] * 7
+        self.last_side = None  # Side the most recent tile went on, see play_tile
+        # Bitboard masks of the tiles that fit an open end and that fit both of them,
+        # updated with the ends so checking a tile is one lookup (see legal_moves)
+        self.playable_mask = bitboard.FULL_MASK
+        self.both_ends_mask = 0
         
     def will_lock_game(self, tile, play_left):
         """Check if playing this tile will lock the game"""
-        # Count occurrences of each number in played tiles
-        number_counts = {}
-        for t in self.played_tiles:
-            number_counts[t[0]] = number_counts.get(t[0], 0) + 1
-            if t[0] != t[1]:  # Don't double count doubles
-                number_counts[t[1]] = number_counts.get(t[1], 0) + 1
-        
-        # Add the tile we're about to play
-        number_counts[tile[0]] = number_counts.get(tile[0], 0) + 1
-        if tile[0] != tile[1]:
-            number_counts[tile[1]] = number_counts.get(tile[1], 0) + 1
-            
         # Check which numbers would be available after playing
         if play_left:
-            available_numbers = [tile[0], self.played_tiles[-1][1]]
+            available_numbers = [tile[0], self.right_end]
         else:
-            available_numbers = [self.played_tiles[0][0], tile[1]]
+            available_numbers = [self.left_end, tile[1]]
             
         # Game locks if all instances of available numbers are played
+        # (counting the tile we're about to play)
         # Each number appears 8 times in total (7 regular tiles + 1 double)
-        return all(number_counts.get(num, 0) >= 8 for num in available_numbers)
+        return all(self.number_counts[num] + (num == tile[0] or num == tile[1]) >= 8
+                   for num in available_numbers)
         
     def count_points(self, player):
         """Count points in player's remaining tiles"""
         return sum(t[0] + t[1] for t in player.tiles)
 
     def play_tile(self, tile, player_name=None, force_left=False, force_right=False):
-        # Update the played tile on the table
-        if not self.played_tiles:
+        """Place a tile on the line of play; every placement goes through here.
+
+        Returns the side it went on, 'L' or 'R' (the opening tile counts as 'R').
+        """
+        opening = not self.played_tiles
+        if opening:
             self.played_tiles.append(tile)
-        elif force_left or (not force_right and (tile[0] == self.played_tiles[0][0] or tile[1] == self.played_tiles[0][0])):
-            if tile[0] == self.played_tiles[0][0]:
-                self.played_tiles.insert(0, tile[::-1])
-            else:
-                self.played_tiles.insert(0, tile)
+            self.left_end, self.right_end = tile[0], tile[1]
+            side = 'R'
+        elif force_left or (not force_right and (tile[0] == self.left_end or tile[1] == self.left_end)):
+            placed = tile[::-1] if tile[0] == self.left_end else tile
+            self.played_tiles.appendleft(placed)
+            self.left_end = placed[0]
+            side = 'L'
         else:  # Play on right
-            if tile[0] == self.played_tiles[-1][1]:
-                self.played_tiles.append(tile)
-            else:
-                self.played_tiles.append(tile[::-1])
+            placed = tile if tile[0] == self.right_end else tile[::-1]
+            self.played_tiles.append(placed)
+            self.right_end = placed[1]
+            side = 'R'
+        self.last_side = side
+        self.playable_mask = bitboard.PLAYABLE_MASK[self.left_end][self.right_end]
+        self.both_ends_mask = bitboard.NUMBER_MASK[self.left_end] & bitboard.NUMBER_MASK[self.right_end]
+
+        self.number_counts[tile[0]] += 1
+        if tile[0] != tile[1]:  # Don't double count doubles
+            self.number_counts[tile[1]] += 1
         
         # Record who played what
         if player_name:
-            self.play_history.append((player_name, tile.copy()))
+            played = tile.copy()
+            self.play_history.append((player_name, played))
+            self.profiles.add(player_name, played, opening)
+        return side
+
+    def record_pass(self, player_name, tiles):
+        """Note that a player holding tiles passed. Only a forced pass, with nothing in
+        hand that fits, shows they lack both open numbers: strategies may pass by choice"""
+        self.pass_history.append((player_name, self.get_playable_numbers()))
+        if self.played_tiles and not bitboard.hand_mask(tiles) & self.playable_mask:
+            self.voids[player_name] = self.voids.get(player_name, 0) | (1 << self.left_end) | (1 << self.right_end)
+
+    def void_tiles(self, player_name):
+        """Mask of the tiles a player can't be holding, going by their passes"""
+        return bitboard.VOID_MASK[self.voids.get(player_name, 0)]
 
     def get_playable_numbers(self):
         if not self.played_tiles:
             return []
-        return [self.played_tiles[0][0], self.played_tiles[-1][1]]
+        return [self.left_end, self.right_end]
+
+    def legal_moves(self, tiles):
+        """Indexes of the tiles that can be played, and of those that fit on either end"""
+        valid, ambiguous = [], []
+        for i, tile in enumerate(tiles):
+            bit = 1 << bitboard.TILE_ID[(tile[0], tile[1])]
+            if bit & self.playable_mask:
+                valid.append(i)
+                if bit & self.both_ends_mask:
+                    ambiguous.append(i)
+        return valid, ambiguous
+
+    def get_line(self):
+        """Tiles on the table in order from left to right, as a list"""
+        return list(self.played_tiles)
+
     def print_table(self):
-        return "Table:", self.played_tiles
+        return "Table:", self.get_line()
 
 # Step 3: Create the Player class
 class Player:
-    def __init__(self, name, strategy):
+    def __init__(self, name, strategy, trace=None, rng=None):
         self.name = name
         self.strategy = strategy
+        self.trace = trace  # Optional callable receiving reasoning strings, e.g. print
+        self.rng = rng if rng is not None else random  # Per-game RNG, see game_rng
         self.tiles = []
         self.memory = {}
         self.team = "AC" if name in ["A", "C"] else "BD"
@@ -84,18 +211,23 @@ class Player:
     def play_turn(self, table):
         # Check if a double domino can be played (prioritized for all strategies)
         playable_numbers = table.get_playable_numbers()
+        # Reasoning is only formatted when someone is listening
+        trace = self.trace
+        context = table.context
 
-        if self.strategy != "User":            
+        # PIMC weighs doubles in its own search
+        if self.strategy not in ("User", "PIMC"):
             double_domino = None
             for tile in self.tiles:
                 if tile[0] == tile[1] and (tile[0] in playable_numbers or not playable_numbers):
                     double_domino = tile
                     break
 
-            if double_domino and random.random() < chance_of_playing_double:
+            if double_domino and self.rng.random() < context.chance_of_playing_double:
                 self.tiles.remove(double_domino)
                 table.play_tile(double_domino)
-                print(f"Player {self.name} prioritized playing double domino {double_domino}")
+                if trace:
+                    trace(f"Player {self.name} prioritized playing double domino {double_domino}")
                 return double_domino
 
         if self.strategy == "Win":
@@ -111,16 +243,18 @@ class Player:
             # Find the best tile to play
             playable_numbers = table.get_playable_numbers()
             best_tile = None
-            best_tile_reason = ""
+            best_resulting = None
 
             if not playable_numbers:
-                # No tiles on the table, play the tile with the most frequent numbers
-                for tile in self.tiles:
-                    if not best_tile or sum(number_counts[n] for n in tile) > sum(number_counts[n] for n in best_tile):
-                        best_tile = tile
-                        best_tile_reason = f"Starting with tile {tile} because it has the most frequent numbers."
-                global initial_tile
-                initial_tile = best_tile
+                # No tiles on the table: the book's opening, or else the tile with the most frequent numbers
+                best_tile = context.book.best_tile(self.tiles) if context.book else None
+                if best_tile is None:
+                    for tile in self.tiles:
+                        if not best_tile or sum(number_counts[n] for n in tile) > sum(number_counts[n] for n in best_tile):
+                            best_tile = tile
+                elif trace:
+                    best_resulting = "book"
+                context.initial_tile = best_tile
             else:
                 # Play to maximize the frequency of playable numbers
                 for tile in self.tiles:
@@ -135,7 +269,7 @@ class Player:
                         resulting_frequency = sum(number_counts.get(n, 0) for n in resulting_playable)
                         if not best_tile or resulting_frequency > sum(number_counts[n] for n in best_tile):
                             best_tile = tile
-                            best_tile_reason = f"Playing tile {tile} to maximize playable numbers {resulting_playable}."
+                            best_resulting = resulting_playable
             if False:
             # This handles the situation where a player has the last unique number
             # and wants to keep it open for future turns.
@@ -151,7 +285,6 @@ class Player:
                         other_number = tile[1] if tile[0] in unique_numbers else tile[0]
                         if other_number in playable_numbers:
                             best_tile = tile
-                            best_tile_reason = f"Playing tile {tile} to keep unique number {tile[0] if tile[1] in unique_numbers else tile[1]} open."
                             break
 
 
@@ -159,7 +292,13 @@ class Player:
             if best_tile:
                 self.tiles.remove(best_tile)
                 table.play_tile(best_tile, self.name)
-                print(f"Player {self.name} reasoning: {best_tile_reason}")
+                if trace:
+                    if best_resulting == "book":
+                        trace(f"Player {self.name} reasoning: Starting with tile {best_tile} from the opening book.")
+                    elif best_resulting is None:
+                        trace(f"Player {self.name} reasoning: Starting with tile {best_tile} because it has the most frequent numbers.")
+                    else:
+                        trace(f"Player {self.name} reasoning: Playing tile {best_tile} to maximize playable numbers {best_resulting}.")
                 return best_tile
 
             # No playable tile, consider switching strategy with teammate
@@ -172,7 +311,8 @@ class Player:
                         break
                 
                 if teammate and len(self.tiles) >= len(teammate.tiles):
-                    print(f"Player {self.name} switches strategy with {teammate.name} after passing")
+                    if trace:
+                        trace(f"Player {self.name} switches strategy with {teammate.name} after passing")
                     self.strategy, teammate.strategy = teammate.strategy, self.strategy
             return None
 
@@ -189,31 +329,26 @@ class Player:
                     teammate = "D"
                 else:                    
                     teammate = "B"
-            teammate_tiles = []
-            
-            # First, add the initial tile if it was played by the teammate
-            if initial_tile:
-                teammate_tiles.append(initial_tile)
-            
-            # Then add all other tiles played by the teammate in order
-            for player_name, tile in table.play_history:
-                if player_name == teammate and tile != initial_tile:
-                    teammate_tiles.append(tile)
-
-            # Weight numbers based on when they were played (earlier tiles have stronger weight)
-            strong_numbers = {}
-            for i, tile in enumerate(teammate_tiles):
-                weight = 1.0 / (i + 1)  # First tile gets weight 1, second 1/2, third 1/3, etc.
-                for number in tile:
-                    strong_numbers[number] = strong_numbers.get(number, 0) + weight
+            # Weight numbers based on when they were played (earlier tiles have stronger weight):
+            # the initial tile first, if it was recorded, then the teammate's other plays in order
+            initial = context.initial_tile
+            if initial and table.profiles.opener != teammate:
+                strong_numbers = table.profiles.weights(teammate, first=initial)
+            else:
+                # Either there's no initial tile, or it's the teammate's first play anyway
+                strong_numbers = table.profiles.weights(teammate)
 
-            print(f"Player {self.name} sees teammate {teammate}'s tiles played in order: {teammate_tiles}")
-            print(f"Player {self.name} sees teammate {teammate}'s weighted numbers as {strong_numbers}")
+            if trace:
+                teammate_tiles = table.profiles.played.get(teammate, [])
+                if initial and initial not in teammate_tiles:
+                    teammate_tiles = [initial] + teammate_tiles
+                trace(f"Player {self.name} sees teammate {teammate}'s tiles played in order: {teammate_tiles}")
+                trace(f"Player {self.name} sees teammate {teammate}'s weighted numbers as "
+                      f"{ {n: w for n, w in enumerate(strong_numbers) if w} }")
 
             # Find a tile to keep teammate's strong numbers available
             playable_numbers = table.get_playable_numbers()
             best_tile = None
-            best_tile_reason = ""
 
             for tile in self.tiles:
                 if tile[0] in playable_numbers or tile[1] in playable_numbers:
@@ -225,26 +360,28 @@ class Player:
                         resulting_playable.add(tile[0])
 
                     # Calculate the weight of the numbers that would remain playable
-                    move_value = sum(strong_numbers.get(n, 0) for n in resulting_playable)
+                    move_value = sum(strong_numbers[n] for n in resulting_playable)
                     if not best_tile or move_value > best_move_value:
                         best_tile = tile
                         best_move_value = move_value
-                        best_tile_reason = f"Playing tile {tile} to keep teammate's strong numbers available (value: {move_value:.2f})"
 
             if best_tile:
                 self.tiles.remove(best_tile)
                 table.play_tile(best_tile, self.name)
-                print(f"Player {self.name} reasoning: {best_tile_reason}")
+                if trace:
+                    trace(f"Player {self.name} reasoning: Playing tile {best_tile} to keep teammate's strong numbers available (value: {best_move_value:.2f})")
                 return best_tile
 
             # If no helping move found, fall back to random strategy
-            print(f"Player {self.name} found no helping move, falling back to random strategy")
-            random.shuffle(self.tiles)
+            if trace:
+                trace(f"Player {self.name} found no helping move, falling back to random strategy")
+            self.rng.shuffle(self.tiles)
             for tile in self.tiles:
                 if tile[0] in playable_numbers or tile[1] in playable_numbers:
                     self.tiles.remove(tile)
                     table.play_tile(tile)
-                    print(f"Player {self.name} played random tile {tile}")
+                    if trace:
+                        trace(f"Player {self.name} played random tile {tile}")
                     return tile
             
             # No playable tile at all, skip turn
@@ -252,7 +389,7 @@ class Player:
 
         if self.strategy == "User":
             print("\nYour turn!")
-            print(f"Table: {table.played_tiles}")
+            print(f"Table: {table.get_line()}")
             print(f"Your tiles: {self.tiles}")
             
             playable_numbers = table.get_playable_numbers()
@@ -291,10 +428,10 @@ class Player:
                         chosen_tile = self.tiles[tile_idx]
                         
                         # Check if we need to ask which side to play on
-                        can_play_left = (chosen_tile[0] == table.played_tiles[0][0] or 
-                                       chosen_tile[1] == table.played_tiles[0][0])
-                        can_play_right = (chosen_tile[0] == table.played_tiles[-1][1] or 
-                                        chosen_tile[1] == table.played_tiles[-1][1])
+                        can_play_left = (chosen_tile[0] == table.left_end or 
+                                       chosen_tile[1] == table.left_end)
+                        can_play_right = (chosen_tile[0] == table.right_end or 
+                                        chosen_tile[1] == table.right_end)
                         
                         if can_play_left and can_play_right:
                             while True:
@@ -303,18 +440,8 @@ class Player:
                                     break
                                 print("Please enter L or R.")
                                 
-                            # Manually handle the tile placement
                             tile = self.tiles.pop(tile_idx)
-                            if side == 'L':
-                                if tile[1] == table.played_tiles[0][0]:
-                                    table.played_tiles.insert(0, tile)
-                                else:
-                                    table.played_tiles.insert(0, tile[::-1])
-                            else:  # side == 'R'
-                                if tile[0] == table.played_tiles[-1][1]:
-                                    table.played_tiles.append(tile)
-                                else:
-                                    table.played_tiles.append(tile[::-1])
+                            table.play_tile(tile, self.name, force_left=(side == 'L'), force_right=(side == 'R'))
                             return tile
                         else:
                             # Normal play
@@ -326,30 +453,46 @@ class Player:
                 except ValueError:
                     print("Please enter a valid number.")
             
+        if self.strategy == "PIMC":
+            # Determinized Monte Carlo over deals consistent with what we've seen
+            me = self.all_players.index(self)
+            move = pimc.choose_move(me, self.all_players, table, self.rng, context.pimc_samples,
+                                    context.pimc_time_budget, context.pimc_workers)
+            if move is None:
+                return None
+            t, side = move
+            tile = next(tile for tile in self.tiles if bitboard.tile_id(tile) == t)
+            self.tiles.remove(tile)
+            table.play_tile(tile, self.name, force_left=(side == 'L'), force_right=(side == 'R'))
+            if trace:
+                trace(f"Player {self.name} reasoning: {tile} chosen by PIMC rollouts")
+            return tile
+
         if self.strategy == "AI":
             # Advanced AI strategy
             playable_numbers = table.get_playable_numbers()
             
             if not playable_numbers:
-                # First play - use a balanced approach
-                number_counts = {}
-                for tile in self.tiles:
-                    for number in tile:
-                        number_counts[number] = number_counts.get(number, 0) + 1
-                
-                best_tile = max(self.tiles, key=lambda t: sum(number_counts.get(n, 0) for n in t))
+                # First play - the book's opening if there is one, or else a balanced approach
+                best_tile = context.book.best_tile(self.tiles) if context.book else None
+                if best_tile is None:
+                    number_counts = {}
+                    for tile in self.tiles:
+                        for number in tile:
+                            number_counts[number] = number_counts.get(number, 0) + 1
+                    
+                    best_tile = max(self.tiles, key=lambda t: sum(number_counts.get(n, 0) for n in t))
+                elif trace:
+                    trace(f"Player {self.name} reasoning: Opening with {best_tile} from the opening book")
                 self.tiles.remove(best_tile)
                 table.play_tile(best_tile, self.name)
-                #global initial_tile
-                initial_tile = best_tile
+                context.initial_tile = best_tile
                 return best_tile
             
             # Analyze played tiles to estimate remaining tiles
-            played_count = {}
-            for player_name, tile in table.play_history:
-                played_count[tile[0]] = played_count.get(tile[0], 0) + 1
-                if tile[0] != tile[1]:
-                    played_count[tile[1]] = played_count.get(tile[1], 0) + 1
+            played_count = table.number_counts
+            # Count how many unplayed tiles of each number exist
+            unplayed_count = [8 - played_count[num] for num in range(7)]
             
             # Find our tiles in hand
             our_count = {}
@@ -386,47 +529,61 @@ class Player:
             if not valid_moves:
                 return None
             
+            # Late game: the move that wins the most deals of the unseen tiles with best play
+            if (context.tablebase and len(valid_moves) > 1
+                    and tablebase.tiles_left(table) <= tablebase.MAX_TILES):
+                move = tablebase.choose_move(self.all_players.index(self), self.all_players, table,
+                                             context.tablebase, self.rng, context.endgame_samples)
+                if move is not None:
+                    t, side = move
+                    tile = next(tile for tile in self.tiles if bitboard.tile_id(tile) == t)
+                    self.tiles.remove(tile)
+                    table.play_tile(tile, self.name, force_left=(side == 'L'), force_right=(side == 'R'))
+                    if trace:
+                        trace(f"Player {self.name} reasoning: {tile} wins the most deals by the endgame tablebase")
+                    return tile
+            
             best_move = None
             best_score = float('-inf')
             
             for idx, tile in valid_moves:
                 score = 0
-                reasoning = []
+                # Only collected when tracing, to keep the simulation path allocation-light
+                reasoning = [] if trace else None
                 
                 # Priority 1: Does it win for us?
                 if our_tiles <= 0:
                     score += 1000
-                    reasoning.append("Win for us (+1000)")
+                    if trace:
+                        reasoning.append("Win for us (+1000)")
                 
                 # Priority 2: Does it help our teammate win?
                 if teammate_tiles <= 0:
                     score += 900
-                    reasoning.append("Win for teammate (+900)")
+                    if trace:
+                        reasoning.append("Win for teammate (+900)")
                 
                 # Priority 3: Does it prevent opponent from winning?
                 if opp1_tiles <= 0 or opp2_tiles <= 0:
                     score -= 500  # Penalize if we let them win
-                    reasoning.append("Opponent close to winning (-500)")
+                    if trace:
+                        reasoning.append("Opponent close to winning (-500)")
                 
                 # Priority 4: Reduce variance - play numbers we have many of
                 numbers_in_tile = set(tile)
                 our_strength = sum(our_count.get(n, 0) for n in numbers_in_tile)
                 score += our_strength * 10
-                reasoning.append(f"Our strength in tile (+{our_strength * 10})")
+                if trace:
+                    reasoning.append(f"Our strength in tile (+{our_strength * 10})")
                 
                 # Priority 5: Block opponent's likely strong numbers
-                # Count how many unplayed tiles of each number exist
-                unplayed_count = {}
-                for num in range(7):
-                    unplayed_count[num] = 8 - played_count.get(num, 0)
-                
                 # If we have a tile with rare numbers, it's less useful
                 rare_bonus = 0
                 for num in numbers_in_tile:
-                    if unplayed_count.get(num, 0) <= 2:
+                    if unplayed_count[num] <= 2:
                         rare_bonus += 5
                 score += rare_bonus
-                if rare_bonus > 0:
+                if trace and rare_bonus > 0:
                     reasoning.append(f"Rare numbers bonus (+{rare_bonus})")
                 
                 # Priority 6: Keep control - prefer moves that don't leave too many options
@@ -437,19 +594,21 @@ class Player:
                     resulting_playable.add(tile[0])
                 
                 # Prefer having few options for opponents (fewer ways to help them)
-                opponent_options = sum(unplayed_count.get(n, 0) for n in resulting_playable)
+                opponent_options = sum(unplayed_count[n] for n in resulting_playable)
                 option_penalty = opponent_options * 2
                 score -= option_penalty
-                reasoning.append(f"Opponent options penalty (-{option_penalty})")
+                if trace:
+                    reasoning.append(f"Opponent options penalty (-{option_penalty})")
                 
                 # Priority 7: Team strategy - help teammate if they're close to winning
                 team_bonus = 0
                 if teammate_tiles <= 3 and teammate_tiles < our_tiles:
                     # Check if this move helps teammate's likely strong numbers
-                    if initial_tile and any(n in initial_tile for n in tile):
+                    if context.initial_tile and any(n in context.initial_tile for n in tile):
                         team_bonus = 50
                         score += team_bonus
-                        reasoning.append(f"Support teammate (+{team_bonus})")
+                        if trace:
+                            reasoning.append(f"Support teammate (+{team_bonus})")
                 
                 if score > best_score:
                     best_score = score
@@ -460,12 +619,13 @@ class Player:
                 self.tiles.remove(tile)
                 table.play_tile(tile, self.name)
                 
-                # Print reasoning
-                if len(valid_moves) == 1:
-                    print(f"Player {self.name} reasoning: No other option available")
-                else:
-                    reasoning_str = ", ".join(reasoning)
-                    print(f"Player {self.name} reasoning: {tile} - {reasoning_str} (total: {best_score:.1f})")
+                # Report reasoning
+                if trace:
+                    if len(valid_moves) == 1:
+                        trace(f"Player {self.name} reasoning: No other option available")
+                    else:
+                        reasoning_str = ", ".join(reasoning)
+                        trace(f"Player {self.name} reasoning: {tile} - {reasoning_str} (total: {best_score:.1f})")
                 return tile
             
             return None
@@ -478,47 +638,22 @@ class Player:
                     next_player = self.all_players[(i + 1) % len(self.all_players)]
                     break
             
-            # Analyze next player's strong numbers based on their plays
-            next_player_tiles = []
-            enemy_team_tiles = []  # Include teammate's plays too
-            
-            # Get the initial tile if it was from next player or their teammate
-            if initial_tile:
-                if self.team != next_player.team:  # They're on the opposite team
-                    next_player_tiles.append(initial_tile)
-                    
-            # Get all plays by next player and their teammate
-            for player_name, tile in table.play_history:
-                player = None
-                for p in self.all_players:
-                    if p.name == player_name:
-                        player = p
-                        break
-                
-                if player and player.team == next_player.team:
-                    enemy_team_tiles.append(tile)
-                    if player == next_player:
-                        next_player_tiles.append(tile)
-            
-            # Weight numbers based on when they were played and who played them
-            enemy_numbers = {}
-            for i, tile in enumerate(next_player_tiles):
-                weight = 2.0 / (i + 1)  # Higher weight for next player's tiles
-                for number in tile:
-                    enemy_numbers[number] = enemy_numbers.get(number, 0) + weight
-                    
-            for i, tile in enumerate(enemy_team_tiles):
-                weight = 1.0 / (i + 1)  # Lower weight for teammate's tiles
-                for number in tile:
-                    enemy_numbers[number] = enemy_numbers.get(number, 0) + weight
+            # Weight the next player's numbers by when they played them (the initial tile
+            # first, if it came from the other team), twice as much as their team's plays
+            initial = context.initial_tile if self.team != next_player.team else None
+            next_weights = table.profiles.weights(next_player.name, first=initial or None)
+            team_weights = table.profiles.weights(next_player.team)
+            enemy_numbers = [2 * a + b for a, b in zip(next_weights, team_weights)]
             
-            print(f"Player {self.name} analyzing enemy team's numbers: {enemy_numbers}")
+            if trace:
+                trace(f"Player {self.name} analyzing enemy team's numbers: "
+                      f"{ {n: w for n, w in enumerate(enemy_numbers) if w} }")
             
             # Try to block their strong numbers
             playable_numbers = table.get_playable_numbers()
             best_tile = None
             best_block_value = -1
-            best_tile_reason = ""
+            best_resulting = None
 
             if not playable_numbers:
                 # No tiles on the table, just play randomly
@@ -541,19 +676,20 @@ class Player:
                     # If we can make both numbers the same (and low weight for enemy),
                     # that's ideal for blocking
                     if len(resulting_playable) == 1:
-                        block_value = 10 - (enemy_numbers.get(list(resulting_playable)[0], 0))
+                        block_value = 10 - enemy_numbers[next(iter(resulting_playable))]
                     else:
-                        block_value = -sum(enemy_numbers.get(n, 0) for n in resulting_playable)
+                        block_value = -sum(enemy_numbers[n] for n in resulting_playable)
                     
                     if block_value > best_block_value:
                         best_tile = tile
                         best_block_value = block_value
-                        best_tile_reason = f"Playing {tile} to force numbers {resulting_playable} (blocking value: {block_value:.2f})"
+                        best_resulting = resulting_playable
             
             if best_tile:
                 self.tiles.remove(best_tile)
                 table.play_tile(best_tile, self.name)
-                print(f"Player {self.name} blocking: {best_tile_reason}")
+                if trace:
+                    trace(f"Player {self.name} blocking: Playing {best_tile} to force numbers {best_resulting} (blocking value: {best_block_value:.2f})")
                 return best_tile
             
             return None
@@ -567,7 +703,7 @@ class Player:
             return tile
 
         # Find a tile that can be played
-        random.shuffle(self.tiles)
+        self.rng.shuffle(self.tiles)
         for tile in self.tiles:
             if tile[0] in playable_numbers or tile[1] in playable_numbers:
                 self.tiles.remove(tile)
@@ -582,83 +718,281 @@ class Player:
         return f"Player {self.name} tiles:", self.tiles
 
 # Step 4: Distribute tiles
-def distribute_tiles(players, tiles):
-    random.shuffle(tiles)
+def distribute_tiles(players, tiles, rng=random):
+    rng.shuffle(tiles)
     for player in players:
         player.tiles = [tiles.pop() for _ in range(7)]
 
+def game_rng(seed, game_index):
+    """Independent RNG for one game, derived only from (master seed, game index).
+
+    Any split of a batch into chunks, processes or machines replays each game
+    identically as long as it keeps the game's index.
+    """
+    return random.Random(f"{seed}:{game_index}")
+
+# One game in progress: whose turn it is, passes, and how it ended. Every front end
+# (simulate_game, ui.py, api.py) drives its turns through advance_game below.
+class Game:
+    def __init__(self, players, table=None):
+        self.players = players
+        self.table = table if table is not None else Table()
+        self.current_player_index = 0
+        self.turn_count = 0
+        self.passes = 0
+        self.game_over = False
+        self.winner = None  # Winning Player; on a lock, A or B for their team
+        self.game_locked = False
+        self._history_len = 0  # Length of table.play_history after the last play
+        for player in players:
+            player.all_players = players
+
+    @property
+    def current_player(self):
+        return self.players[self.current_player_index]
+
+    def team_points(self):
+        """(team AC, team BD) points left in hand"""
+        team_ac_points = sum(self.table.count_points(p) for p in self.players if p.team == "AC")
+        team_bd_points = sum(self.table.count_points(p) for p in self.players if p.team == "BD")
+        return team_ac_points, team_bd_points
+
+    def play(self, tile, side=None, quiet=False):
+        """The current player plays tile from their hand ('L'/'R' picks the end); returns the events.
+
+        quiet leaves the play out of table.play_history, as when a strategy plays
+        a double by the priority rule; replays use it to rebuild the same history.
+        """
+        player = self.current_player
+        player.tiles.remove(tile)
+        self.table.play_tile(tile, None if quiet else player.name,
+                             force_left=(side == 'L'), force_right=(side == 'R'))
+        return self._end_turn(player, True)
+
+    def pass_turn(self):
+        """The current player passes; returns the events"""
+        return self._end_turn(self.current_player, False)
+
+    def _end_turn(self, player, played):
+        table = self.table
+        if played:
+            self.passes = 0
+            placed = table.played_tiles[0] if table.last_side == 'L' else table.played_tiles[-1]
+            events = [{"type": "tile_played", "player": player.name, "tile": list(placed), "side": table.last_side}]
+            if len(table.play_history) == self._history_len:
+                events[0]["quiet"] = True
+            self._history_len = len(table.play_history)
+        else:
+            self.passes += 1
+            table.record_pass(player.name, player.tiles)
+            events = [{"type": "pass", "player": player.name}]
+
+        if not player.tiles:
+            self.winner = player
+        elif self.passes >= len(self.players):
+            # Locked: the team with fewer points wins, awarded to A or B
+            self.game_locked = True
+            team_ac_points, team_bd_points = self.team_points()
+            self.winner = self.players[0] if team_ac_points < team_bd_points else self.players[1]
+        else:
+            self.turn_count += 1
+            self.current_player_index = (self.current_player_index + 1) % len(self.players)
+            return events
+
+        self.game_over = True
+        team_ac_points, team_bd_points = self.team_points()
+        events.append({"type": "game_over", "winner": self.winner.name, "game_locked": self.game_locked,
+                       "team_ac_points": team_ac_points, "team_bd_points": team_bd_points})
+        return events
+
+def advance_game(game, max_steps=None, time_budget=None, stop_at_user=True):
+    """Play turns with each player's own strategy until the game ends, a "User"
+    player is to move (unless stop_at_user is False), max_steps turns have been
+    played or time_budget seconds have passed. At least one turn is played if
+    any may be. Returns the events, as from Game.play/pass_turn.
+    """
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    events = []
+    steps = 0
+    while not game.game_over:
+        player = game.current_player
+        if stop_at_user and player.strategy == "User":
+            break
+        if max_steps is not None and steps >= max_steps:
+            break
+        if deadline is not None and steps and time.monotonic() >= deadline:
+            break
+        tile = player.play_turn(game.table)
+        events += game._end_turn(player, tile is not None)
+        steps += 1
+    return events
+
 def printv(verbose, *args):
     if verbose:
         print(*args)
 
 # Step 5: Simulate the game
-def simulate_game(verbose=False):
+def simulate_game(verbose=False, rng=None, chance_of_playing_double=1, strategies=("AI", "AI", "AI", "AI"),
+                  endgame=None):
+    """Play one game and return the winning Player"""
+    return play_game(verbose, rng, chance_of_playing_double, strategies, endgame).winner
+
+def play_game(verbose=False, rng=None, chance_of_playing_double=1, strategies=("AI", "AI", "AI", "AI"),
+              endgame=None):
+    """Play one game and return the finished Game.
+
+    endgame is GameContext's: the "AI" strategy only searches the endgame when it's
+    given (e.g. True), which plays stronger but takes two to three times as long.
+    """
+    rng = rng if rng is not None else random
     tiles = create_tiles()
-    table = Table()
-    players = [Player(name, "Random") for name in ["A", "B", "C", "D"]]
+    table = Table(GameContext(chance_of_playing_double, endgame=endgame))
+    # Strategy reasoning goes to stdout only in verbose mode
+    trace = print if verbose else None
     #******************
-    #Possible strategies are "Win", "Help", "Block", "Random", "AI", "User"
-    players[0].strategy = "AI"  # Set player A to use the Win strategy
-    players[1].strategy = "AI"  # Set player B to use Random strategy
-    players[2].strategy = "AI"  # Set player C to use the Help strategy
-    players[3].strategy = "AI"  # Set player D to use Random strategy
-    
-    # Give each player access to all players for strategy switching
-    for player in players:
-        player.all_players = players
+    #Possible strategies are "Win", "Help", "Block", "Random", "AI", "PIMC", "User"
+    players = [Player(name, strategy, trace, rng) for name, strategy in zip(["A", "B", "C", "D"], strategies)]
     
-    distribute_tiles(players, tiles)
+    distribute_tiles(players, tiles, rng)
     for i in range(4):
         printv(verbose, f"Player {i} tiles: {players[i].tiles}")
-    passes = 0
-    winner = None
-    current_player_index = 0
-    while True:
-        current_player = players[current_player_index]
-        played_tile = current_player.play_turn(table)
-        if played_tile:
-            passes = 0
-            printv(verbose, f"Player {current_player.name} played {played_tile}")
-            printv(verbose, table.print_table())
-        else:
-            passes += 1
-            printv(verbose, f"Player {current_player.name} skipped their turn")
-
-        if not current_player.tiles:
-            print(f"Player {current_player.name} wins!")
-            winner = current_player
-            break
-        if passes >= len(players):
-            printv(verbose, "Game locked.")
-            # Count points for each team
-            team_ac_points = sum(table.count_points(p) for p in players if p.team == "AC")
-            team_bd_points = sum(table.count_points(p) for p in players if p.team == "BD")
-            printv(verbose, f"Team AC points: {team_ac_points}")
-            printv(verbose, f"Team BD points: {team_bd_points}")
-            # Give victory to A or B depending on which team has fewer points
-            if team_ac_points < team_bd_points:
-                winner = next(p for p in players if p.name == "A")
-                print(f"Player A wins (Team AC: {team_ac_points} points vs Team BD: {team_bd_points} points)")
+    # Game gives each player access to all players for strategy switching
+    game = Game(players, table)
+    if not verbose:
+        advance_game(game, stop_at_user=False)
+        return game
+
+    # One turn at a time so the events print between the players' reasoning
+    while not game.game_over:
+        for event in advance_game(game, max_steps=1, stop_at_user=False):
+            if event["type"] == "tile_played":
+                print(f"Player {event['player']} played {event['tile']}")
+                print(table.print_table())
+            elif event["type"] == "pass":
+                print(f"Player {event['player']} skipped their turn")
+            elif event["game_locked"]:
+                print("Game locked.")
+                print(f"Team AC points: {event['team_ac_points']}")
+                print(f"Team BD points: {event['team_bd_points']}")
+                if event["winner"] == "A":
+                    print(f"Player A wins (Team AC: {event['team_ac_points']} points vs Team BD: {event['team_bd_points']} points)")
+                else:
+                    print(f"Player B wins (Team BD: {event['team_bd_points']} points vs Team AC: {event['team_ac_points']} points)")
             else:
-                winner = next(p for p in players if p.name == "B")
-                print(f"Player B wins (Team BD: {team_bd_points} points vs Team AC: {team_ac_points} points)")
-            break
-
-        current_player_index = (current_player_index + 1) % len(players)
-    return winner
-
-if __name__ == "__main__":
-    results = {}
-    for player in ["A", "B", "C", "D", "TIE", 'TEAM_AC', 'TEAM_BD']:
-        results[player] = 0
-    
-    for _ in range(n_sims):
-        winner = simulate_game(False)
+                print(f"Player {event['winner']} wins!")
+    return game
+
+def _empty_results():
+    # TURNS adds up the length of every game
+    return {player: 0 for player in ["A", "B", "C", "D", "TIE", 'TEAM_AC', 'TEAM_BD', 'TURNS']}
+
+def _simulate_chunk(args):
+    """Worker entry point: play games [start, start + n_games) of a batch"""
+    seed, start, n_games, engine, endgame = args
+    if engine == "numpy":
+        # Lockstep games share one generator, seeded from the chunk's first game index
+        import vecsim  # Optional dependency, only needed for this engine
+        results = vecsim.simulate_batch(n_games, seed=[seed, start], batch_size=n_games)
+        results['TURNS'] = round(results.pop("avg_turns") * n_games)
+        return results
+    results = _empty_results()
+    for game_index in range(start, start + n_games):
+        rng = game_rng(seed, game_index)
+        if engine == "bitboard":
+            game = bitboard.BitGame.deal(rng)
+            winner = bitboard.NAMES[bitboard.play_out(game, [bitboard.ai_policy] * 4, rng)]
+            results[winner] += 1
+            results['TEAM_AC' if winner in ("A", "C") else 'TEAM_BD'] += 1
+            results['TURNS'] += game.turns
+            continue
+        game = play_game(False, rng, endgame=endgame)
+        results['TURNS'] += game.turn_count + 1
+        winner = game.winner
         if winner:
             results[winner.name] += 1
             results['TEAM_' + winner.team] += 1
         else:
             results["TIE"] += 1
-    print(f"Results after {n_sims} games:")
-    for player, wins in results.items():
-        print(f"Player {player}: {wins} ({wins/n_sims*100:.2f}%) wins")
+    return results
+
+# Step 6: Simulate many games across a process pool
+def simulate_batch(n_games, seed=0, workers=None, chunk_size=1000, engine="objects", start=0,
+                   precision=None, on_progress=None, endgame=False):
+    """Play games [start, start + n_games) of the batch for seed on a process pool.
+
+    Returns a stats.SimulationStats, updated as each chunk finishes; on_progress,
+    if given, is called with it every time. With precision set, the batch stops
+    early once the 95% interval for team AC's win rate is within +/- precision.
+
+    engine is "objects" for the Player/Table game, "bitboard" for the mask-based
+    engine in bitboard.py or "numpy" for the lockstep engine in vecsim.py
+    (the last two play all-AI games only). With endgame, the objects engine's
+    "AI" players search the late game (see tablebase.py), which the other
+    engines don't, so their results are no longer comparable.
+
+    Every game gets its own RNG from (seed, game index), so results don't depend
+    on the number of workers or the chunk size, and a batch can be sharded across
+    machines with start/n_games and the partial results summed. Chunks are taken
+    in order when stopping early, so the stopping point is reproducible too. The
+    numpy engine seeds per chunk instead and is only reproducible for a fixed
+    chunk_size.
+    """
+    chunks = []
+    for chunk_start in range(start, start + n_games, chunk_size):
+        size = min(chunk_size, start + n_games - chunk_start)
+        chunks.append((seed, chunk_start, size, engine, True if endgame else None))
+
+    stats = SimulationStats()
+    if workers == 1:
+        partials = map(_simulate_chunk, chunks)
+    else:
+        pool = Pool(workers)
+        imap = pool.imap if precision is not None else pool.imap_unordered
+        partials = imap(_simulate_chunk, chunks)
+    try:
+        for partial in partials:
+            stats.add(partial)
+            if on_progress:
+                on_progress(stats)
+            if precision is not None and stats.settled(precision):
+                break
+    finally:
+        if workers != 1:
+            # Chunks still running are of no use once we stop
+            pool.terminate()
+            pool.join()
+    return stats
+
+def progress_printer(interval=1.0):
+    """on_progress callback that prints the running totals at most every interval seconds"""
+    last = [0.0]
+    def show(stats):
+        now = time.monotonic()
+        if now - last[0] >= interval:
+            last[0] = now
+            print(stats.progress(), flush=True)
+    return show
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate domino games")
+    parser.add_argument("-n", "--n-sims", type=int, default=n_sims, help="number of games to simulate (the most, with --precision)")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="worker processes (0 = one per core)")
+    parser.add_argument("-s", "--seed", type=int, default=None, help="master seed for reproducible runs")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="games per worker task")
+    parser.add_argument("--start", type=int, default=0, help="index of the first game, for sharding a batch")
+    parser.add_argument("--engine", choices=["objects", "bitboard", "numpy"], default="objects",
+                        help="game engine: Player/Table objects, the compact bitboard engine or NumPy lockstep")
+    parser.add_argument("--precision", type=float, default=None,
+                        help="stop once team AC's win rate is known to +/- this (95%% interval), e.g. 0.005")
+    parser.add_argument("--endgame", action="store_true",
+                        help="let AI players search the endgame (objects engine; stronger but slower)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't print running totals")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.getrandbits(64)
+    stats = simulate_batch(args.n_sims, seed=seed, workers=args.workers or None, chunk_size=args.chunk_size,
+                           engine=args.engine, start=args.start, precision=args.precision,
+                           on_progress=None if args.quiet else progress_printer(), endgame=args.endgame)
+    print(f"Results after {stats.games} games (seed {seed}):")
+    for line in stats.report():
+        print(line)
@@ -0,0 +1,62 @@
+"""In-memory store for the games served by api.py.
+
+Games are kept by id in least-recently-used order. A game that hasn't been
+touched for ttl seconds is dropped the next time the store is used (any add,
+get or remove), and once max_games are held the least recently used one makes
+room for a new game.
+
+max_games is the store's memory cap: it counts games rather than measuring
+them. A finished game with its event log and cached state takes about 45 KB,
+so the default 10000 games come to roughly half a gigabyte.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class GameStore:
+    def __init__(self, max_games=10000, ttl=3600):
+        self.max_games = max_games
+        self.ttl = ttl
+        self._games = OrderedDict()  # game_id -> (last access time, game state)
+        self._lock = threading.Lock()  # Guards the index only, never held while a game is played
+
+    def __len__(self):
+        return len(self._games)
+
+    def _evict(self, now, room=0):
+        """Drop expired games, then the least recently used ones until room more fit"""
+        # Oldest entries are at the front, so this stops at the first one to keep
+        while self._games:
+            game_id, (last_access, _) = next(iter(self._games.items()))
+            if now - last_access <= self.ttl and len(self._games) + room <= self.max_games:
+                break
+            del self._games[game_id]
+
+    def add(self, game_state, game_id=None):
+        """Store a game and return its id; a new id is made up unless one is given"""
+        if game_id is None:
+            game_id = secrets.token_urlsafe(8)
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now, room=1)
+            self._games[game_id] = (now, game_state)
+        return game_id
+
+    def get(self, game_id):
+        """Game state for game_id, or None if it doesn't exist or has expired"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._games.get(game_id)
+            if entry is None:
+                return None
+            self._games[game_id] = (now, entry[1])
+            self._games.move_to_end(game_id)
+            return entry[1]
+
+    def remove(self, game_id):
+        with self._lock:
+            self._evict(time.monotonic())
+            return self._games.pop(game_id, None) is not None
@@ -0,0 +1,171 @@
+"""Perfect-information solver.
+
+Given every hand and the open ends, searches the game tree to find which team
+wins with best play from both sides. Values are from the point of view of the
+team to move: +1 win, -1 loss. Passing is only allowed (and forced) when the
+player has no legal tile, and a locked game goes to the team with fewer points
+as in runme.simulate_game.
+
+The search is negamax with alpha-beta pruning, a transposition table keyed on
+the packed state (hand masks, open ends, passes, player to move) and move
+ordering that tries the transposition table's best move, then doubles, then
+moves that leave ends we can follow.
+"""
+from bitboard import (TILES, IS_DOUBLE, OTHER_END, NUMBER_MASK, PLAYABLE_MASK, popcount,
+                      pip_sum, mask_ids, hand_mask, to_tile)
+
+WIN = 1
+LOSS = -1
+EXACT, LOWER, UPPER = 0, 1, 2
+_NO_END = 7  # Packed value of an empty end
+
+
+def pack_state(hands, left, right, passes, to_move):
+    """One int for a position; left/right are swapped into order since the line is symmetric"""
+    if left is None:
+        left = right = _NO_END
+    elif left > right:
+        left, right = right, left
+    return (hands[0] | hands[1] << 28 | hands[2] << 56 | hands[3] << 84
+            | left << 112 | right << 115 | passes << 118 | to_move << 120)
+
+def unpack_state(key):
+    """(hands, left, right, passes, to_move) from pack_state, with the ends in packed order"""
+    hands = [key >> (28 * i) & 0xFFFFFFF for i in range(4)]
+    left, right = key >> 112 & 7, key >> 115 & 7
+    if left == _NO_END:
+        left = right = None
+    return hands, left, right, key >> 118 & 3, key >> 120 & 3
+
+def lock_value(hands, to_move):
+    """Value of a locked game for the team to move"""
+    team_ac = pip_sum(hands[0]) + pip_sum(hands[2])
+    team_bd = pip_sum(hands[1]) + pip_sum(hands[3])
+    ac_wins = team_ac < team_bd
+    return WIN if ac_wins == (to_move % 2 == 0) else LOSS
+
+def legal_moves(hand, left, right):
+    """(tile, side, new_left, new_right) for every distinct legal move; side is 'L', 'R' or None"""
+    if left is None:
+        return [(t, None) + TILES[t] for t in mask_ids(hand)]
+    moves = []
+    for t in mask_ids(hand & PLAYABLE_MASK[left][right]):
+        other = OTHER_END[t][left]
+        if other >= 0:
+            moves.append((t, 'L', other, right))
+        other = OTHER_END[t][right]
+        # Same resulting ends on both sides is one move, not two
+        if other >= 0 and (left != right or OTHER_END[t][left] < 0):
+            moves.append((t, 'R', left, other))
+    return moves
+
+
+class Solver:
+    """Alpha-beta search with a transposition table that persists across calls.
+
+    locks=0 or 1 hands every locked game to that team (0 for A/C, 1 for B/D)
+    instead of counting pips; solving both ways shows whether a result depends
+    on pips at all (see tablebase.py).
+    """
+
+    def __init__(self, locks=None):
+        self.tt = {}  # packed state -> (value, flag, best tile)
+        self.nodes = 0
+        self.locks = locks
+
+    def _ordered(self, hand, moves, first_tile=None):
+        """Moves sorted best-first: the transposition table's move, doubles, then moves
+        whose new ends we can follow ourselves, then heavier tiles"""
+        def priority(move):
+            t, side, l, r = move
+            rest = hand & ~(1 << t)
+            return (t == first_tile, IS_DOUBLE[t], popcount(rest & (NUMBER_MASK[l] | NUMBER_MASK[r])),
+                    TILES[t][0] + TILES[t][1])
+        moves.sort(key=priority, reverse=True)
+        return moves
+
+    def search(self, hands, left, right, passes, to_move, alpha=LOSS, beta=WIN):
+        """Value of the position for the team to move"""
+        self.nodes += 1
+        key = pack_state(hands, left, right, passes, to_move)
+        entry = self.tt.get(key)
+        first_tile = None
+        if entry is not None:
+            value, flag, first_tile = entry
+            if flag == EXACT:
+                return value
+            if flag == LOWER and value >= beta:
+                return value
+            if flag == UPPER and value <= alpha:
+                return value
+        alpha_orig = alpha
+
+        hand = hands[to_move]
+        nxt = (to_move + 1) & 3
+        moves = legal_moves(hand, left, right)
+        if not moves:
+            if passes + 1 >= 4:
+                if self.locks is None:
+                    value = lock_value(hands, to_move)
+                else:
+                    value = WIN if self.locks == to_move % 2 else LOSS
+            else:
+                value = -self.search(hands, left, right, passes + 1, nxt, -beta, -alpha)
+            self.tt[key] = (value, EXACT, None)
+            return value
+
+        best_value, best_tile = LOSS - 1, None
+        child = list(hands)
+        for t, side, l, r in self._ordered(hand, moves, first_tile):
+            child[to_move] = hand & ~(1 << t)
+            if not child[to_move]:
+                value = WIN
+            else:
+                value = -self.search(child, l, r, 0, nxt, -beta, -alpha)
+            if value > best_value:
+                best_value, best_tile = value, t
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+
+        if best_value <= alpha_orig:
+            flag = UPPER
+        elif best_value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        # The best tile is kept for move ordering only (sides can swap under pack_state)
+        self.tt[key] = (best_value, flag, best_tile)
+        return best_value
+
+    def best_move(self, hands, left, right, passes, to_move):
+        """(value, move) where move is (tile id, side) or None if the player must pass"""
+        moves = legal_moves(hands[to_move], left, right)
+        if not moves:
+            return self.search(hands, left, right, passes, to_move), None
+        nxt = (to_move + 1) & 3
+        best = None
+        for t, side, l, r in self._ordered(hands[to_move], moves):
+            child = list(hands)
+            child[to_move] &= ~(1 << t)
+            value = WIN if not child[to_move] else -self.search(child, l, r, 0, nxt)
+            if best is None or value > best[0]:
+                best = (value, (t, side))
+            if value == WIN:
+                break
+        return best
+
+
+def solve(table, players, to_move, passes=0, solver=None):
+    """Solve a runme Table + Players position.
+
+    Returns (value, move) for players[to_move]'s team, where move is
+    ([a, b], side) with side 'L'/'R' (None on an empty table), or None for a pass.
+    """
+    solver = solver if solver is not None else Solver()
+    hands = [hand_mask(p.tiles) for p in players]
+    value, move = solver.best_move(hands, table.left_end, table.right_end, passes, to_move)
+    if move is not None:
+        move = (to_tile(move[0]), move[1])
+    return value, move
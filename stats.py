@@ -0,0 +1,72 @@
+"""Running statistics for batches of simulated games.
+
+Results come in a chunk at a time (see runme.simulate_batch). The win counts,
+Wilson confidence intervals and average game length are kept current as they
+arrive, so a run can report progress and stop as soon as the win rate is
+known to the precision asked for.
+"""
+import math
+
+Z_95 = 1.959964  # Two-sided 95% normal quantile
+
+PLAYERS = ["A", "B", "C", "D", "TIE"]
+TEAMS = ["TEAM_AC", "TEAM_BD"]
+
+
+def wilson_interval(wins, n, z=Z_95):
+    """Wilson score interval (low, high) for a win rate of wins out of n"""
+    if n == 0:
+        return 0.0, 1.0
+    p = wins / n
+    z2 = z * z
+    denom = 1 + z2 / n
+    centre = (p + z2 / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z2 / (4 * n * n)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+class SimulationStats:
+    def __init__(self):
+        self.results = {key: 0 for key in PLAYERS + TEAMS}
+        self.games = 0
+        self.turns = 0  # Turns (plays and passes) over all games
+
+    def add(self, partial):
+        """Merge a chunk's results: win counts by key plus "TURNS" """
+        for key in PLAYERS + TEAMS:
+            self.results[key] += partial.get(key, 0)
+        self.games += sum(partial.get(key, 0) for key in PLAYERS)
+        self.turns += partial.get("TURNS", 0)
+
+    def rate(self, key):
+        return self.results[key] / self.games if self.games else 0.0
+
+    def interval(self, key, z=Z_95):
+        return wilson_interval(self.results[key], self.games, z)
+
+    def half_width(self, key="TEAM_AC", z=Z_95):
+        low, high = self.interval(key, z)
+        return (high - low) / 2
+
+    def avg_length(self):
+        return self.turns / self.games if self.games else 0.0
+
+    def settled(self, precision, key="TEAM_AC", min_games=100):
+        """True once the 95% interval for key is no wider than +/- precision"""
+        return self.games >= min_games and self.half_width(key) <= precision
+
+    def progress(self):
+        """One line of running totals"""
+        low, high = self.interval("TEAM_AC")
+        return (f"{self.games} games: team AC {self.rate('TEAM_AC') * 100:.2f}% "
+                f"(95% CI {low * 100:.2f}-{high * 100:.2f}%), avg {self.avg_length():.1f} turns")
+
+    def report(self):
+        """Lines for the final results table"""
+        lines = []
+        for key in PLAYERS + TEAMS:
+            low, high = self.interval(key)
+            lines.append(f"Player {key}: {self.results[key]} ({self.rate(key) * 100:.2f}%) wins"
+                         f"  [95% CI {low * 100:.2f}-{high * 100:.2f}%]")
+        lines.append(f"Average game length: {self.avg_length():.2f} turns")
+        return lines
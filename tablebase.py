@@ -0,0 +1,298 @@
+"""Endgame tablebase: exact results for positions with few tiles left.
+
+Once at most MAX_TILES tiles are left in the four hands together, solver.py
+settles a position in a few dozen nodes, so every such position has an exact
+value and best move. The tablebase keeps them in a SQLite file, filled offline
+from the late positions of simulated games, every deal of them the player to
+move couldn't tell apart included:
+
+    python tablebase.py --games 2000    # writes tablebase.db
+
+Most results don't depend on who would win a locked game. Those are stored
+once per class of equivalent positions, under canonical.canonical_state, and
+found again for any renaming of the numbers; the rest are stored under their
+own packed position (solver.pack_state).
+
+Reads go through an LRU cache in front of the file, and a position in neither
+is solved on the spot and cached, so the reader answers every position and the
+file only makes the common ones cheaper.
+
+The "AI" strategy can't see the other hands, so in the late game it asks about
+each deal of the unseen tiles that fits what it has seen (choose_move) and
+plays the move that wins in the most of them.
+"""
+import argparse
+import itertools
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from bitboard import BitGame, FULL_MASK, POLICIES, hand_mask, mask_ids, playable, popcount
+from canonical import canonical_state, original_move
+from pimc import sample_hands
+from solver import LOSS, WIN, Solver, legal_moves, pack_state, unpack_state
+
+MAX_TILES = 8
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebase.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    key BLOB PRIMARY KEY,  -- solver.pack_state, 16 bytes little-endian
+    value INTEGER NOT NULL,  -- 1 if the team to move wins with best play, -1 if not
+    tile INTEGER,            -- Best tile id, NULL if the player must pass
+    side TEXT                -- 'L'/'R' for the packed order of the ends (left <= right)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS shared (
+    key BLOB PRIMARY KEY,  -- canonical.canonical_state of positions whose result ignores pips
+    value INTEGER NOT NULL,
+    tile INTEGER,            -- In the canonical position's numbering
+    side TEXT
+) WITHOUT ROWID;
+"""
+
+_FLIP = {'L': 'R', 'R': 'L', None: None}
+
+
+def lock_free(solvers, hands, left, right, passes, to_move):
+    """(value, move) of a position whose result is the same however locks are scored,
+    or None if it depends on them. solvers[t] is a Solver(locks=t)."""
+    team = to_move % 2
+    # Winning even when every lock goes the other way, or losing even when they all go our way
+    value, move = solvers[1 - team].best_move(hands, left, right, passes, to_move)
+    if value == WIN or solvers[team].search(hands, left, right, passes, to_move) == LOSS:
+        return value, move
+    return None
+
+
+class Tablebase:
+    """Reader for a tablebase file (or none), with an LRU cache of probed positions"""
+
+    def __init__(self, path=None, cache_size=100000):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # packed position -> (value, tile, side in packed order)
+        self._db = None
+        self._shared = False
+        if path and os.path.exists(path):
+            self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            self._shared = self._db.execute("SELECT 1 FROM shared LIMIT 1").fetchone() is not None
+        self._solver = Solver()
+        # Game actions run on worker threads in the API; the cache, connection and solver are shared
+        self._lock = threading.Lock()
+        self.hits = self.reads = self.solved = 0
+
+    def probe(self, hands, left, right, passes, to_move):
+        """(value, move) for the team to move, move being (tile id, side) or None for a pass"""
+        key = pack_state(hands, left, right, passes, to_move)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                entry = self._read(key, hands, left, right, passes, to_move)
+                if entry is None:
+                    entry = self._solve(key)
+                self._cache[key] = entry
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        value, tile, side = entry
+        if tile is None:
+            return value, None
+        # pack_state puts the lower end first; undo that for the caller's ends
+        return value, (tile, _FLIP[side] if left is not None and left > right else side)
+
+    def _read(self, key, hands, left, right, passes, to_move):
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT value, tile, side FROM positions WHERE key = ?",
+                               (key.to_bytes(16, "little"),)).fetchone()
+        if row is None and self._shared:
+            shared_key, renaming, _ = canonical_state(hands, left, right, passes, to_move)
+            row = self._db.execute("SELECT value, tile, side FROM shared WHERE key = ?",
+                                   (shared_key.to_bytes(16, "little"),)).fetchone()
+            if row is not None and row[1] is not None:
+                tile, side = original_move(row[1:], renaming, left, right)
+                row = (row[0], tile, _FLIP[side] if left > right else side)
+        if row is not None:
+            self.reads += 1
+        return row
+
+    def _solve(self, key):
+        self.solved += 1
+        if len(self._solver.tt) > self.cache_size:
+            self._solver.tt.clear()
+        value, move = self._solver.best_move(*unpack_state(key))
+        return (value, None, None) if move is None else (value,) + move
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+
+_default_tablebase = None
+
+def default_tablebase():
+    """Reader for DEFAULT_PATH (solving everything if the file isn't there), shared by the process"""
+    global _default_tablebase
+    if _default_tablebase is None:
+        _default_tablebase = Tablebase(DEFAULT_PATH)
+    return _default_tablebase
+
+
+def tiles_left(table):
+    """Tiles still in the four hands (every tile is dealt)"""
+    return 28 - len(table.played_tiles)
+
+def consistent_deals(me, my_hand, sizes, unseen, forbidden, rng, limit):
+    """Deals of the unseen tiles to the other players that fit their hand sizes and voids:
+    all of them when there are at most limit, otherwise limit random ones"""
+    others = [p for p in range(4) if p != me]
+    total = math.factorial(popcount(unseen))
+    for p in others:
+        total //= math.factorial(sizes[p])
+    if total > limit:
+        deals = []
+        for _ in range(limit):
+            hands = sample_hands(me, my_hand, sizes, unseen, forbidden, rng)
+            if hands is not None:
+                deals.append(hands)
+        return deals
+
+    deals = []
+
+    def deal(i, pool, hands):
+        if i == len(others):
+            deals.append(list(hands))
+            return
+        p = others[i]
+        for combo in itertools.combinations(mask_ids(pool & ~forbidden[p]), sizes[p]):
+            hand = sum(1 << t for t in combo)
+            hands[p] = hand
+            deal(i + 1, pool & ~hand, hands)
+        hands[p] = 0
+
+    hands = [0, 0, 0, 0]
+    hands[me] = my_hand
+    deal(0, unseen, hands)
+    return deals
+
+def choose_move(me, players, table, tablebase, rng=random, samples=32):
+    """Move for players[me] that wins the most deals of the unseen tiles with best play,
+    as (tile id, side), or None when every move does equally well (or there's only one).
+
+    Only for positions with at most MAX_TILES tiles left in the hands.
+    """
+    my_hand = hand_mask(players[me].tiles)
+    left, right = table.left_end, table.right_end
+    moves = legal_moves(my_hand, left, right)
+    if len(moves) < 2:
+        return None
+    sizes = [len(p.tiles) for p in players]
+    unseen = FULL_MASK & ~my_hand & ~hand_mask(table.played_tiles)
+    forbidden = [table.void_tiles(p.name) for p in players]
+    forbidden[me] = 0
+    nxt = (me + 1) & 3
+
+    wins = [0] * len(moves)
+    for hands in consistent_deals(me, my_hand, sizes, unseen, forbidden, rng, samples):
+        for i, (t, side, l, r) in enumerate(moves):
+            child = list(hands)
+            child[me] &= ~(1 << t)
+            # Our team wins if we went out, or if the next player's team loses from here
+            if not child[me] or tablebase.probe(child, l, r, 0, nxt)[0] == LOSS:
+                wins[i] += 1
+    if min(wins) == max(wins):
+        return None
+    best = max(range(len(moves)), key=lambda i: wins[i])
+    return moves[best][0], moves[best][1]
+
+
+# Generating the tablebase
+def late_position(rng, max_tiles, policy="AI"):
+    """A simulated game played with policy up to the first position with at most
+    max_tiles tiles left, or None if it ended before that"""
+    game = BitGame.deal(rng)
+    choose = POLICIES[policy]
+    while sum(popcount(hand) for hand in game.hands) > max_tiles:
+        legal = playable(game.hands[game.to_move], game.left, game.right)
+        if legal:
+            mover = game.to_move
+            game.play(choose(game, legal, rng))
+            if not game.hands[mover]:
+                return None
+        else:
+            game.pass_turn()
+            if game.passes >= 4:
+                return None
+    return game
+
+def generate(path=DEFAULT_PATH, games=2000, seed=0, max_tiles=MAX_TILES, on_progress=None):
+    """Solve the late positions of simulated games into the file at path; returns how many were added.
+
+    For each game, every deal of the hidden tiles that the player to move can't
+    rule out is solved, along with everything the search passes through.
+    """
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    solver = Solver()
+    solvers = [Solver(locks=0), Solver(locks=1)]
+    added = 0
+    for i in range(games):
+        rng = random.Random(f"{seed}:{i}")
+        game = late_position(rng, max_tiles)
+        if game is not None:
+            me = game.to_move
+            unseen = FULL_MASK & ~game.hands[me] & ~game.played
+            sizes = [popcount(hand) for hand in game.hands]
+            deals = consistent_deals(me, game.hands[me], sizes, unseen, [0, 0, 0, 0], rng, 1000)
+            for s in [solver] + solvers:
+                s.tt.clear()
+            for hands in deals:
+                solver.best_move(hands, game.left, game.right, game.passes, me)
+            rows, shared_rows = [], []
+            for key in list(solver.tt):
+                state = unpack_state(key)
+                if state[1] is not None and lock_free(solvers, *state) is not None:
+                    # Stored once for every renaming, solved in the canonical numbering
+                    shared_key = canonical_state(*state)[0]
+                    value, move = lock_free(solvers, *unpack_state(shared_key))
+                    tile, side = move if move is not None else (None, None)
+                    shared_rows.append((shared_key.to_bytes(16, "little"), value, tile, side))
+                else:
+                    value, move = solver.best_move(*state)
+                    tile, side = move if move is not None else (None, None)
+                    rows.append((key.to_bytes(16, "little"), value, tile, side))
+            with db:
+                before = db.total_changes
+                db.executemany("INSERT OR IGNORE INTO positions VALUES (?, ?, ?, ?)", rows)
+                db.executemany("INSERT OR IGNORE INTO shared VALUES (?, ?, ?, ?)", shared_rows)
+                added += db.total_changes - before
+        if on_progress:
+            on_progress(i + 1, games, added)
+    db.close()
+    return added
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate the endgame tablebase")
+    parser.add_argument("--games", type=int, default=2000, help="simulated games to take late positions from")
+    parser.add_argument("--max-tiles", type=int, default=MAX_TILES, help="tiles left in the hands at most")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="seed for the simulated games")
+    parser.add_argument("-o", "--out", default=DEFAULT_PATH, help="tablebase file to write (or add to)")
+    args = parser.parse_args()
+
+    start = time.time()
+    last = [0.0]
+
+    def show(done, total, added):
+        if time.time() - last[0] >= 1 or done == total:
+            last[0] = time.time()
+            print(f"\r{done}/{total} games, {added} positions", end="", flush=True)
+
+    added = generate(args.out, args.games, args.seed, args.max_tiles, show)
+    print(f"\nAdded {added} positions to {args.out} in {time.time() - start:.0f}s")
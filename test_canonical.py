@@ -0,0 +1,78 @@
+"""Canonical keys under the symmetries they factor out, and Zobrist hashes kept
+up a move at a time against the ones computed from scratch.
+
+    python -m pytest -q
+"""
+import random
+
+import canonical
+from bitboard import N_NUMBERS, TILE_ID, TILES, BitGame, mask_ids
+from solver import WIN, Solver, legal_moves, unpack_state
+from test_solver import late_positions
+
+
+def renamed(hand, renaming):
+    return sum(1 << TILE_ID[tuple(sorted((renaming[a], renaming[b])))] for a, b in (TILES[t] for t in mask_ids(hand)))
+
+
+def test_canonical_key_ignores_symmetries():
+    rng = random.Random(4)
+    for hands, left, right, passes, to_move in late_positions(300, 10, 4):
+        key = canonical.canonical_state(hands, left, right, passes, to_move)[0]
+        renaming = list(range(N_NUMBERS))
+        rng.shuffle(renaming)
+        shifted = [renamed(hand, renaming) for hand in hands[2:] + hands[:2]]
+        # Renamed numbers, ends read the other way round and every seat two places on
+        other = canonical.canonical_state(shifted, renaming[right], renaming[left], passes, (to_move + 2) % 4)
+        assert other[0] == key
+
+        # The renaming it returns takes the position to the canonical one
+        _, renaming, shift = canonical.canonical_state(hands, left, right, passes, to_move)
+        seated = hands[shift:] + hands[:shift]
+        c_hands, c_left, c_right, c_passes, c_to_move = unpack_state(key)
+        assert c_hands == [renamed(hand, renaming) for hand in seated]
+        assert sorted((c_left, c_right)) == sorted((renaming[left], renaming[right]))
+        assert (c_passes, c_to_move) == (passes, (to_move - shift) % 4)
+
+        # With locks scored the same for every numbering, values and moves carry over exactly
+        solver = Solver(locks=0)
+        value, move = solver.best_move(*unpack_state(key))
+        assert solver.search(hands, left, right, passes, to_move) == value
+        if move is not None:
+            t, side = canonical.original_move(move, renaming, left, right)
+            t, side, l, r = next(m for m in legal_moves(hands[to_move], left, right) if m[:2] == (t, side))
+            child = list(hands)
+            child[to_move] &= ~(1 << t)
+            assert (WIN if not child[to_move] else -solver.search(child, l, r, 0, (to_move + 1) % 4)) == value
+
+
+def test_canonical_hand_ignores_renaming():
+    rng = random.Random(5)
+    for _ in range(500):
+        hand = sum(1 << t for t in rng.sample(range(len(TILES)), 7))
+        renaming = list(range(N_NUMBERS))
+        rng.shuffle(renaming)
+        key, to_key = canonical.canonical_hand(hand)
+        assert canonical.canonical_hand(renamed(hand, renaming))[0] == key
+        assert renamed(hand, to_key) == key
+
+
+def test_zobrist_updates_match_full_hash():
+    rng = random.Random(7)
+    seen = set()
+    for _ in range(200):
+        game = BitGame.deal(rng)
+        h = canonical.zobrist(game.hands, game.left, game.right, game.passes, game.to_move)
+        while game.winner() is None:
+            legal = game.legal()
+            if legal:
+                t = rng.choice(mask_ids(legal))
+                h = canonical.zobrist_play(h, game.to_move, t, game.left, game.right, game.passes)
+                game.play(t)
+            else:
+                h = canonical.zobrist_pass(h, game.to_move, game.passes)
+                game.pass_turn()
+            assert h == canonical.zobrist(game.hands, game.left, game.right, game.passes, game.to_move)
+            seen.add(h)
+    # Positions of different games collide only by (very bad) luck
+    assert len(seen) > 200 * 20
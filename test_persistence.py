@@ -0,0 +1,70 @@
+"""Stored games: rebuilding one from its move log, and a copy that falls behind
+another process's log being reloaded instead of overwriting it.
+
+    python -m pytest -q
+"""
+import random
+
+import pytest
+
+from persistence import SqliteBackend
+from sessions import GameStore
+
+api = pytest.importorskip("api")  # Needs flask
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    store = SqliteBackend(str(tmp_path / "games.db"))
+    monkeypatch.setattr(api, "store", store)
+    monkeypatch.setattr(api, "games", GameStore())
+    random.seed(6)  # The API deals and its AI players draw from the global RNG
+    try:
+        yield api.app.test_client()
+    finally:
+        store.close()
+
+
+def test_restore_replays_the_move_log(client, monkeypatch):
+    for g in range(12):
+        state = client.post('/api/game/start', json={'player_position': g % 4}).get_json()
+        game_id = state['game_id']
+        for _ in range(g):
+            if state['game_over']:
+                break
+            if state['valid_moves']:
+                i = random.choice(state['valid_moves'])
+                client.post(f'/api/game/{game_id}/play', json={'tile_index': i, 'side': random.choice('LR')})
+            else:
+                client.post(f'/api/game/{game_id}/skip')
+            state = client.get(f'/api/game/{game_id}/state').get_json()
+        before = api.games.get(game_id)
+
+        monkeypatch.setattr(api, "games", GameStore())  # As after a restart
+        assert client.get(f'/api/game/{game_id}/state').get_json() == state
+        after = api.games.get(game_id)
+        assert after["events"] == before["events"]
+        # The store keeps which plays were quiet; clients never see the flag
+        assert not any("quiet" in event for event in after["events"])
+        assert after["game"].table.context.initial_tile == before["game"].table.context.initial_tile
+    assert client.get('/api/game/missing/state').status_code == 404
+
+
+def test_stale_copy_is_reloaded(client, monkeypatch):
+    state = client.post('/api/game/start', json={'player_position': 0}).get_json()
+    game_id = state['game_id']
+    assert state['valid_moves']
+    first = api.games
+
+    # A second process picks the game up from the store and plays a move
+    monkeypatch.setattr(api, "games", GameStore())
+    client.post(f'/api/game/{game_id}/play', json={'tile_index': state['valid_moves'][0], 'side': 'L'})
+    other = client.get(f'/api/game/{game_id}/state').get_json()
+
+    # The first still has the old copy; its move for the same turn must not replace the stored one
+    monkeypatch.setattr(api, "games", first)
+    client.post(f'/api/game/{game_id}/play', json={'tile_index': state['valid_moves'][-1], 'side': 'R'})
+    api.store.flush()
+    assert api.store.stale(game_id)
+    assert client.get(f'/api/game/{game_id}/state').get_json() == other
+    assert not api.store.stale(game_id)
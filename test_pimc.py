@@ -0,0 +1,56 @@
+"""Deals sampled for PIMC rollouts.
+
+    python -m pytest -q
+"""
+import random
+
+from bitboard import FULL_MASK, N_TILES, hand_mask, mask_ids, popcount, tile_id
+from pimc import choose_move, sample_hands
+from runme import GameContext, Player, Table, create_tiles, distribute_tiles
+from solver import legal_moves
+
+
+def test_sample_hands_fits_tight_voids():
+    rng = random.Random(8)
+    for _ in range(200):
+        ids = list(range(N_TILES))
+        rng.shuffle(ids)
+        hands = [sum(1 << t for t in ids[7 * p:7 * p + 7]) for p in range(4)]
+        unseen = hands[1] | hands[2] | hands[3]
+        # Each other player is ruled out of most tiles they don't really hold,
+        # so few deals fit and drawing at random rarely finds one
+        forbidden = [0, 0, 0, 0]
+        for p in (1, 2, 3):
+            forbidden[p] = sum(1 << t for t in mask_ids(unseen & ~hands[p]) if rng.random() < 0.8)
+        dealt = sample_hands(0, hands[0], [7, 7, 7, 7], unseen, forbidden, rng, tries=5)
+        assert dealt is not None
+        assert dealt[0] == hands[0]
+        assert dealt[1] | dealt[2] | dealt[3] == unseen
+        for p in (1, 2, 3):
+            assert popcount(dealt[p]) == 7
+            assert not dealt[p] & forbidden[p]
+
+    # Voids no deal fits
+    assert sample_hands(0, hands[0], [7, 7, 7, 7], unseen, [0, unseen, 0, 0], rng) is None
+
+
+def test_choose_move_without_samples_uses_the_ai_heuristic():
+    rng = random.Random(9)
+    players = [Player(name, "PIMC", rng=rng) for name in "ABCD"]
+    # A hand without doubles, which both engines' "AI" would play first
+    while True:
+        distribute_tiles(players, create_tiles(), rng)
+        if all(a != b for a, b in players[0].tiles):
+            break
+    table = Table(GameContext())
+    for _ in range(20):
+        # A deadline already past still plays a sample per job
+        move = choose_move(0, players, table, rng, samples=10, time_budget=-1.0)
+        assert move in [m[:2] for m in legal_moves(hand_mask(players[0].tiles), None, None)]
+
+    # Voids that no deal fits: nothing can be played out, and the heuristic's move comes back
+    table.void_tiles = lambda name: FULL_MASK
+    ai = Player("A", "AI", rng=rng)
+    ai.tiles = list(players[0].tiles)
+    expected = tile_id(ai.play_turn(Table(GameContext())))
+    assert choose_move(0, players, table, rng)[0] == expected
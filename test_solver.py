@@ -0,0 +1,68 @@
+"""The solver against plain minimax on late positions of simulated games.
+
+    python -m pytest -q
+"""
+import random
+
+import pytest
+
+from bitboard import TILES, mask_ids, pip_sum
+from solver import LOSS, WIN, Solver, legal_moves
+from tablebase import late_position
+
+
+def late_positions(n, max_tiles, seed):
+    """n positions from simulated games with at most max_tiles tiles left"""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < n:
+        game = late_position(rng, max_tiles)
+        if game is not None:
+            positions.append((list(game.hands), game.left, game.right, game.passes, game.to_move))
+    return positions
+
+
+def minimax(hands, left, right, passes, to_move):
+    """Value for the team to move by plain minimax over the rules, written out
+    separately from the solver: no pruning, no table, no shared move generator"""
+    hand = hands[to_move]
+    nxt = (to_move + 1) % 4
+    children = []
+    for t in mask_ids(hand):
+        a, b = TILES[t]
+        for end, kept in ((left, right), (right, left)):
+            if a == end:
+                children.append((t, b, kept))
+            if b == end:
+                children.append((t, a, kept))
+    if not children:
+        if passes + 1 == 4:
+            team_ac = pip_sum(hands[0]) + pip_sum(hands[2])
+            team_bd = pip_sum(hands[1]) + pip_sum(hands[3])
+            return WIN if (team_ac < team_bd) == (to_move % 2 == 0) else LOSS
+        return -minimax(hands, left, right, passes + 1, nxt)
+    best = LOSS
+    for t, new_end, kept in children:
+        child = list(hands)
+        child[to_move] &= ~(1 << t)
+        if not child[to_move]:
+            return WIN
+        best = max(best, -minimax(child, new_end, kept, 0, nxt))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_solver_matches_minimax(seed):
+    solver = Solver()
+    for hands, left, right, passes, to_move in late_positions(100, 8, seed):
+        expected = minimax(hands, left, right, passes, to_move)
+        assert solver.search(hands, left, right, passes, to_move) == expected
+        value, move = solver.best_move(hands, left, right, passes, to_move)
+        assert value == expected
+        if move is not None:
+            # The move it picks must reach that value
+            t, side, l, r = next(m for m in legal_moves(hands[to_move], left, right) if m[:2] == move)
+            child = list(hands)
+            child[to_move] &= ~(1 << t)
+            assert (WIN if not child[to_move] else -minimax(child, l, r, 0, (to_move + 1) % 4)) == expected
+
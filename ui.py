@@ -1,6 +1,7 @@
 import os
 import sys
-from runme import simulate_game, Player, Table, create_tiles, distribute_tiles
+from runme import Game, Player, Table, advance_game, create_tiles, distribute_tiles, play_game, progress_printer
+from stats import SimulationStats
 
 def clear_screen():
     """Clear the terminal screen"""
@@ -38,7 +39,7 @@ def play_with_human_player(player_position):
     
     tiles = create_tiles()
     table = Table()
-    players = [Player(name, "AI") for name in ["A", "B", "C", "D"]]
+    players = [Player(name, "AI", trace=print) for name in ["A", "B", "C", "D"]]
     
     # Set player position to User
     players[player_position].strategy = "User"
@@ -54,11 +55,9 @@ def play_with_human_player(player_position):
         players[1].strategy = "Block"   # B blocks
         players[3].strategy = "Block"   # D blocks
     
-    # Give each player access to all players for strategy switching
-    for player in players:
-        player.all_players = players
-    
     distribute_tiles(players, tiles)
+    # Game gives each player access to all players for strategy switching
+    game = Game(players, table)
     
     print(f"\nYou are playing as Player {player_name}")
     print(f"Your teammate is Player {'C' if player_position == 0 else 'A'}")
@@ -66,21 +65,15 @@ def play_with_human_player(player_position):
     print("\nPress Enter to start the game...")
     input()
     
-    passes = 0
-    winner = None
-    current_player_index = 0
-    turn_count = 0
-    
-    while True:
-        turn_count += 1
-        current_player = players[current_player_index]
+    while not game.game_over:
+        current_player = game.current_player
         
         # Clear screen and show game state
         clear_screen()
         print_header()
-        print(f"\nTurn {turn_count} - Player {current_player.name}'s turn")
+        print(f"\nTurn {game.turn_count + 1} - Player {current_player.name}'s turn")
         print("-" * 60)
-        print(f"Table: {table.played_tiles}")
+        print(f"Table: {table.get_line()}")
         print(f"\nTile counts: A={len(players[0].tiles)}, B={len(players[1].tiles)}, "
               f"C={len(players[2].tiles)}, D={len(players[3].tiles)}")
         
@@ -91,43 +84,29 @@ def play_with_human_player(player_position):
         else:
             print("First play - any tile is playable")
         
-        played_tile = current_player.play_turn(table)
-        
-        if played_tile:
-            passes = 0
-            print(f"Player {current_player.name} played {played_tile}")
-        else:
-            passes += 1
-            print(f"Player {current_player.name} passed their turn")
-        
-        if not current_player.tiles:
-            print(f"\n{'=' * 60}")
-            print(f"PLAYER {current_player.name} WINS!")
-            print(f"{'=' * 60}")
-            winner = current_player
-            break
-        
-        if passes >= len(players):
-            print(f"\n{'=' * 60}")
-            print("GAME LOCKED!")
-            # Count points for each team
-            team_ac_points = sum(table.count_points(p) for p in players if p.team == "AC")
-            team_bd_points = sum(table.count_points(p) for p in players if p.team == "BD")
-            print(f"Team AC points: {team_ac_points}")
-            print(f"Team BD points: {team_bd_points}")
-            # Give victory to A or B depending on which team has fewer points
-            if team_ac_points < team_bd_points:
-                winner = next(p for p in players if p.name == "A")
-                print(f"TEAM AC WINS! (Player A awarded victory)")
+        # One turn, ours included: the "User" strategy asks for our tile
+        for event in advance_game(game, max_steps=1, stop_at_user=False):
+            if event["type"] == "tile_played":
+                print(f"Player {event['player']} played {event['tile']}")
+            elif event["type"] == "pass":
+                print(f"Player {event['player']} passed their turn")
+            elif not event["game_locked"]:
+                print(f"\n{'=' * 60}")
+                print(f"PLAYER {event['winner']} WINS!")
+                print(f"{'=' * 60}")
             else:
-                winner = next(p for p in players if p.name == "B")
-                print(f"TEAM BD WINS! (Player B awarded victory)")
-            print(f"{'=' * 60}")
-            break
-        
-        current_player_index = (current_player_index + 1) % len(players)
+                print(f"\n{'=' * 60}")
+                print("GAME LOCKED!")
+                print(f"Team AC points: {event['team_ac_points']}")
+                print(f"Team BD points: {event['team_bd_points']}")
+                # Victory goes to A or B depending on which team has fewer points
+                if event["winner"] == "A":
+                    print(f"TEAM AC WINS! (Player A awarded victory)")
+                else:
+                    print(f"TEAM BD WINS! (Player B awarded victory)")
+                print(f"{'=' * 60}")
         
-        if current_player != players[player_position]:
+        if not game.game_over and current_player != players[player_position]:
             input("Press Enter to continue...")
     
     print("\nGame Over!")
@@ -143,28 +122,32 @@ def simulate_games_no_humans():
     except ValueError:
         num_games = 10
     
+    try:
+        precision = float(input("Stop early once team AC's win rate is known to +/- (e.g. 0.01, blank to play all): ") or "0")
+    except ValueError:
+        precision = 0
+    
     print(f"\nSimulating {num_games} games...")
     print("-" * 60)
     
-    results = {}
-    for player in ["A", "B", "C", "D", "TIE"]:
-        results[player] = 0
-    
+    stats = SimulationStats()
+    show_progress = progress_printer()
     for i in range(num_games):
-        print(f"Game {i+1}...", end=" ", flush=True)
-        winner = simulate_game(verbose=False)
+        game = play_game(verbose=False)
+        winner = game.winner
         if winner:
-            results[winner.name] += 1
+            stats.add({winner.name: 1, "TEAM_" + winner.team: 1, "TURNS": game.turn_count + 1})
         else:
-            results["TIE"] += 1
-        print("done")
+            stats.add({"TIE": 1, "TURNS": game.turn_count + 1})
+        show_progress(stats)
+        if precision and stats.settled(precision):
+            break
     
     print("\n" + "=" * 60)
     print("RESULTS")
     print("=" * 60)
-    for player, wins in results.items():
-        percentage = (wins / num_games * 100) if num_games > 0 else 0
-        print(f"Player {player}: {wins} ({percentage:.1f}%) wins")
+    for line in stats.report():
+        print(line)
     print("=" * 60)
     
     input("\nPress Enter to return to menu...")
@@ -0,0 +1,183 @@
+"""Lockstep simulation of many games at once with NumPy.
+
+All games in a batch are dealt together and advanced one turn at a time:
+hands, open ends, pass counters and per-number counts are arrays with one row
+per game, the Random and "AI" strategies are scored as array operations across
+the batch, and finished games are masked out instead of looped over. Rules and
+strategies follow runme.simulate_game / bitboard.play_out.
+
+Needs numpy (pip install numpy).
+"""
+import numpy as np
+
+from bitboard import TILES, N_TILES, N_NUMBERS, NAMES
+
+TILE_A = np.array([a for a, b in TILES], dtype=np.int64)
+TILE_B = np.array([b for a, b in TILES], dtype=np.int64)
+TILE_PIPS = TILE_A + TILE_B
+IS_DOUBLE = TILE_A == TILE_B
+# TILE_HAS[t, n]: tile t shows number n
+TILE_HAS = np.zeros((N_TILES, N_NUMBERS), dtype=bool)
+TILE_HAS[np.arange(N_TILES), TILE_A] = True
+TILE_HAS[np.arange(N_TILES), TILE_B] = True
+# SHARES[i, t]: tiles i and t have a number in common
+SHARES = (TILE_HAS.astype(np.int64) @ TILE_HAS.T.astype(np.int64)) > 0
+# Float copy so the per-number sums below go through BLAS
+_TILE_HAS_F = TILE_HAS.astype(np.float32)
+# Column of TILE_HAS.T for an empty end (-1) is all False
+_FITS = np.vstack([TILE_HAS.T, np.zeros((1, N_TILES), dtype=bool)])
+
+
+class BatchGames:
+    """Arrays for a batch of games advanced in lockstep"""
+
+    def __init__(self, n_games, rng):
+        self.rng = rng
+        order = rng.permuted(np.tile(np.arange(N_TILES), (n_games, 1)), axis=1)
+        self.hands = np.zeros((n_games, 4, N_TILES), dtype=bool)
+        rows = np.arange(n_games)[:, None]
+        for p in range(4):
+            self.hands[rows, p, order[:, 7 * p:7 * p + 7]] = True
+        self.left = np.full(n_games, -1, dtype=np.int64)
+        self.right = np.full(n_games, -1, dtype=np.int64)
+        self.passes = np.zeros(n_games, dtype=np.int64)
+        self.number_counts = np.zeros((n_games, N_NUMBERS), dtype=np.int64)
+        self.initial_tile = np.full(n_games, -1, dtype=np.int64)
+        self.turns = np.zeros(n_games, dtype=np.int64)
+        self.winner = np.full(n_games, -1, dtype=np.int64)
+        self.active = np.ones(n_games, dtype=bool)
+
+
+def _pick(scores, legal, noise):
+    """Index of the best legal tile per row; noise in [0, 0.5) breaks ties between integer scores"""
+    return np.argmax(np.where(legal, scores + noise, -np.inf), axis=1)
+
+def random_scores(games, idx, p, hand, legal):
+    return np.zeros(legal.shape, dtype=np.float32)
+
+def ai_scores(games, idx, p, hand, legal):
+    """The "AI" heuristic of Player.play_turn for every candidate tile of every game.
+
+    Terms that are equal for every candidate (the win/lose bonuses) are left out.
+    """
+    n = len(idx)
+    rows = np.arange(n)
+    left, right = games.left[idx], games.right[idx]
+    our_count = hand.astype(np.float32) @ _TILE_HAS_F  # (n, 7), doubles once
+    if left[0] < 0 and (left < 0).all():
+        # First play: tile whose numbers we hold most of, doubles counting twice
+        counts2 = our_count + hand[:, IS_DOUBLE]  # doubles are ordered 0-0 .. 6-6 by number
+        return counts2[:, TILE_A] + counts2[:, TILE_B]
+
+    unplayed = (8 - games.number_counts[idx]).astype(np.float32)
+    scores = (our_count * 10 + (unplayed <= 2) * 5) @ _TILE_HAS_F.T
+    # Numbers the heuristic treats as playable afterwards: both ends, plus the far
+    # side of the tile for each half that matches an end (as a set, so no repeats)
+    un_left = unplayed[rows, np.maximum(left, 0)]
+    un_right = unplayed[rows, np.maximum(right, 0)]
+    base = un_left + np.where(right != left, un_right, 0)
+    l, r = left[:, None], right[:, None]
+    a_open = (TILE_A == l) | (TILE_A == r)
+    b_open = (TILE_B == l) | (TILE_B == r)
+    add_b = a_open & ~b_open
+    add_a = b_open & ~a_open
+    scores -= 2 * (base[:, None] + add_b * unplayed[:, TILE_B] + add_a * unplayed[:, TILE_A])
+
+    our_tiles = hand.sum(axis=1) - 1
+    teammate_tiles = games.hands[idx, (p + 2) % 4].sum(axis=1)
+    initial = games.initial_tile[idx]
+    support = (teammate_tiles <= 3) & (teammate_tiles < our_tiles) & (initial >= 0)
+    if support.any():
+        scores += 50 * (support[:, None] & SHARES[np.maximum(initial, 0)])
+    first = left < 0
+    if first.any():
+        counts2 = our_count + hand[:, IS_DOUBLE]
+        scores = np.where(first[:, None], counts2[:, TILE_A] + counts2[:, TILE_B], scores)
+    return scores
+
+POLICIES = {"Random": random_scores, "AI": ai_scores}
+
+
+def step(games, p, policy, double_chance=1.0):
+    """Advance every unfinished game by one turn of player p"""
+    idx = np.flatnonzero(games.active)
+    if not len(idx):
+        return
+    rng = games.rng
+    hand = games.hands[idx, p]
+    left, right = games.left[idx], games.right[idx]
+    legal = hand & ((left < 0)[:, None] | _FITS[left] | _FITS[right])
+    can_play = legal.any(axis=1)
+
+    doubles = legal & IS_DOUBLE[None, :]
+    take_double = doubles.any(axis=1)
+    if double_chance < 1:
+        take_double &= rng.random(len(idx)) < double_chance
+    scores = policy(games, idx, p, hand, legal)
+    noise = rng.random(legal.shape, dtype=np.float32) * 0.5
+    choice = np.where(take_double, _pick(0, doubles, noise), _pick(scores, legal, noise))
+
+    # Passes
+    passed = idx[~can_play]
+    games.passes[passed] += 1
+
+    # Plays
+    rows = idx[can_play]
+    t = choice[can_play]
+    l, r = left[can_play], right[can_play]
+    a, b = TILE_A[t], TILE_B[t]
+    empty = l < 0
+    on_left = ~empty & ((a == l) | (b == l))
+    on_right = ~empty & ~on_left
+    new_left = np.where(empty, a, np.where(on_left, np.where(a == l, b, a), l))
+    new_right = np.where(empty, b, np.where(on_right, np.where(a == r, b, a), r))
+    games.left[rows], games.right[rows] = new_left, new_right
+    games.hands[rows, p, t] = False
+    games.number_counts[rows, a] += 1
+    games.number_counts[rows, b] += (a != b)
+    # As in Player.play_turn, only an opening that isn't a double is remembered
+    games.initial_tile[rows] = np.where(empty & ~IS_DOUBLE[t], t, games.initial_tile[rows])
+    games.passes[rows] = 0
+    games.turns[idx] += 1
+
+    # Finished games
+    won = rows[~games.hands[rows, p].any(axis=1)]
+    games.winner[won] = p
+    games.active[won] = False
+    locked = passed[games.passes[passed] >= 4]
+    if len(locked):
+        pips = games.hands[locked].astype(np.int64) @ TILE_PIPS  # (n, 4)
+        team_ac = pips[:, 0] + pips[:, 2]
+        team_bd = pips[:, 1] + pips[:, 3]
+        games.winner[locked] = np.where(team_ac < team_bd, 0, 1)
+        games.active[locked] = False
+
+def run_batch(n_games, strategies=("AI", "AI", "AI", "AI"), rng=None, double_chance=1.0):
+    """Play n_games to the end and return the BatchGames with winners filled in"""
+    rng = rng if rng is not None else np.random.default_rng()
+    games = BatchGames(n_games, rng)
+    policies = [POLICIES[s] for s in strategies]
+    turn = 0
+    while games.active.any():
+        step(games, turn % 4, policies[turn % 4], double_chance)
+        turn += 1
+    return games
+
+def simulate_batch(n_games, strategies=("AI", "AI", "AI", "AI"), seed=None, batch_size=10000, double_chance=1.0):
+    """Results dict in the same format as runme.simulate_batch, plus the average game length"""
+    rng = np.random.default_rng(seed)
+    results = {player: 0 for player in ["A", "B", "C", "D", "TIE", 'TEAM_AC', 'TEAM_BD']}
+    total_turns = 0
+    done = 0
+    while done < n_games:
+        size = min(batch_size, n_games - done)
+        games = run_batch(size, strategies, rng, double_chance)
+        wins = np.bincount(games.winner, minlength=4)
+        for i, name in enumerate(NAMES):
+            results[name] += int(wins[i])
+        results['TEAM_AC'] += int(wins[0] + wins[2])
+        results['TEAM_BD'] += int(wins[1] + wins[3])
+        total_turns += int(games.turns.sum())
+        done += size
+    results["avg_turns"] = total_turns / n_games if n_games else 0.0
+    return results
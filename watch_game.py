@@ -0,0 +1,41 @@
+"""Follow a game's event stream from the command line.
+
+    python watch_game.py GAME_ID [--url http://localhost:5001] [--since N]
+
+Prints each event as the server pushes it and stops when the game is over.
+Works against api.py and async_api.py alike.
+"""
+import argparse
+import json
+import urllib.request
+
+
+def follow(base_url, game_id, since=0):
+    """Yield a game's events as they arrive"""
+    url = f"{base_url}/api/game/{game_id}/events?since={since}"
+    with urllib.request.urlopen(url) as stream:
+        data = []
+        for raw in stream:
+            line = raw.decode().rstrip("\n")
+            if line.startswith("data: "):
+                data.append(line[6:])
+            elif not line and data:
+                yield json.loads("\n".join(data))
+                data = []
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print a game's events as they happen")
+    parser.add_argument("game_id")
+    parser.add_argument("--url", default="http://localhost:5001")
+    parser.add_argument("--since", type=int, default=0, help="last event already seen")
+    args = parser.parse_args()
+
+    for event in follow(args.url, args.game_id, args.since):
+        if event["type"] == "tile_played":
+            print(f"{event['seq']:3}  {event['player']} played {event['tile']} on the {'left' if event['side'] == 'L' else 'right'}")
+        elif event["type"] == "pass":
+            print(f"{event['seq']:3}  {event['player']} passed")
+        else:
+            print(f"{event['seq']:3}  Game over, winner {event['winner']}"
+                  f"{' (locked)' if event['game_locked'] else ''}")